@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_environment(**overrides: str):
+    """Make the bot importable with throwaway settings; call before importing any bot module"""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bot-olympiad-bench-"), "bench.db")
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("CHANNEL_ID", "@bench_channel")
+    os.environ.setdefault("CHANNEL_INVITE_LINK", "https://t.me/bench_channel")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench")
+    os.environ.update(overrides)
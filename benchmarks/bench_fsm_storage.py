@@ -0,0 +1,82 @@
+"""
+Per-update FSM storage overhead: aiogram's MemoryStorage (before) vs the persistent SQLiteStorage (after)
+
+    python benchmarks/bench_fsm_storage.py --updates 20000 --users 1000
+"""
+import argparse
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from _common import setup_environment
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+async def _warm_key(storage: BaseStorage, updates: int) -> float:
+    """Microseconds per get_state + set_data on one already cached session"""
+    await storage.set_state(_key(1), "UserStates:registration_email")
+    started = time.perf_counter()
+    for i in range(updates):
+        await storage.get_state(_key(1))
+        await storage.set_data(_key(1), {"olympiad_id": "bench", "step": i})
+    return (time.perf_counter() - started) / updates * 1e6
+
+
+async def _many_users(storage: BaseStorage, users: int) -> float:
+    """Updates per second for many concurrent sessions touching their state for the first time"""
+    async def session(user_id: int):
+        for step in range(5):
+            await storage.set_state(_key(user_id), f"UserStates:step_{step}")
+            await storage.update_data(_key(user_id), {"step": step})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(user_id) for user_id in range(1000, 1000 + users)))
+    return users * 10 / (time.perf_counter() - started)
+
+
+async def run(updates: int, users: int):
+    from config.database import init_sqlite_db
+    from config.migrations import run_migrations
+    from database.fsm_storage import SQLiteStorage
+    from database.sqlite_pool import sqlite_pool
+    from database.write_queue import write_queue
+
+    await sqlite_pool.open()
+    await init_sqlite_db()
+    await run_migrations()
+    await write_queue.start()
+
+    sqlite_storage = SQLiteStorage(sqlite_pool, write_queue, 100, 3600, 600, 300)
+    await sqlite_storage.start()
+    try:
+        for name, storage in (("before", MemoryStorage()), ("after", sqlite_storage)):
+            per_update = await _warm_key(storage, updates)
+            throughput = await _many_users(storage, users)
+            print(f"  {name:6} warm key {per_update:5.1f} us/update  {users} new sessions {throughput:9.0f} ops/s")
+
+        started = time.perf_counter()
+        await sqlite_storage.close()
+        print(f"  final flush of {users + 1} sessions: {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        await write_queue.stop()
+        await sqlite_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_environment()
+    print(f"get_state + set_data x{args.updates}; {args.users} sessions x 5 set_state + update_data")
+    asyncio.run(run(args.updates, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Latency of concurrent Supabase reads: a new sync client per call (before) vs the shared pooled async client (after)
+
+Runs against a local PostgREST stand-in that answers every request after a fixed delay:
+
+    python benchmarks/bench_supabase_client.py --requests 200 --latency-ms 20
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from typing import Awaitable, Callable, List
+
+from aiohttp import web
+
+from _common import setup_environment
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port: int, latency: float, ready: threading.Event):
+    """Fake PostgREST in its own thread, so the blocking 'before' client cannot stall it"""
+    async def handle(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        return web.json_response([{"price": 10}])
+
+    async def main():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def _measure(call: Callable[[], Awaitable[None]], requests: int) -> dict:
+    # Every request is issued at once, so latency counts from the burst start (what a waiting user sees)
+    latencies: List[float] = []
+    started = time.perf_counter()
+
+    async def timed():
+        await call()
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    return {
+        "total_s": time.perf_counter() - started,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def run(requests: int, url: str) -> dict:
+    from supabase import create_client
+    from config.database import close_supabase_client, init_supabase_client
+    from config.settings import settings
+    from database.supabase_manager import SupabaseManager
+
+    async def before():
+        # Previous get_supabase_client(): a new sync client per call, blocking the event loop
+        client = create_client(url, settings.supabase_service_role_key)
+        client.table("olympiads").select("price").eq("id", "bench").execute()
+
+    async def after():
+        await SupabaseManager.get_olympiad_price("bench")
+
+    results = {"before": await _measure(before, requests)}
+    await init_supabase_client()
+    try:
+        results["after"] = await _measure(after, requests)
+    finally:
+        await close_supabase_client()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    setup_environment(SUPABASE_URL=url)
+
+    ready = threading.Event()
+    threading.Thread(target=_serve, args=(port, args.latency_ms / 1000, ready), daemon=True).start()
+    ready.wait()
+
+    results = asyncio.run(run(args.requests, url))
+    print(f"{args.requests} concurrent reads, {args.latency_ms:.0f}ms server latency")
+    for name, result in results.items():
+        print(f"  {name:6} total {result['total_s']:.2f}s  mean {result['mean_ms']:.1f}ms  p95 {result['p95_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
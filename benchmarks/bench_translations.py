@@ -0,0 +1,89 @@
+"""
+Cost of a translation lookup: nested-dict walk per call (before) vs the precompiled flat table (after)
+
+    python benchmarks/bench_translations.py --calls 200000
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from _common import ROOT, setup_environment
+
+
+class LegacyLanguageManager:
+    """get_text as it was before the flat table: split the key and walk the nested locale dict on every call"""
+
+    SUPPORTED_LANGUAGES = ['en', 'ru', 'uz']
+    DEFAULT_LANGUAGE = 'en'
+
+    _translations: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load_translations(cls):
+        for lang in cls.SUPPORTED_LANGUAGES:
+            with open(Path(ROOT) / 'locales' / f'{lang}.json', 'r', encoding='utf-8') as f:
+                cls._translations[lang] = json.load(f)
+
+    @classmethod
+    def get_text(cls, key: str, language: str = DEFAULT_LANGUAGE, **kwargs) -> str:
+        if language not in cls.SUPPORTED_LANGUAGES:
+            language = cls.DEFAULT_LANGUAGE
+
+        text = cls._get_nested_value(cls._translations.get(language, {}), key)
+        if text is None:
+            text = cls._get_nested_value(cls._translations.get(cls.DEFAULT_LANGUAGE, {}), key)
+        if text is None:
+            return key
+
+        try:
+            if kwargs:
+                text = text.format(**kwargs)
+        except KeyError:
+            pass
+        return text
+
+    @classmethod
+    def _get_nested_value(cls, dictionary: Dict, key: str) -> Optional[str]:
+        value = dictionary
+        for k in key.split('.'):
+            if isinstance(value, dict):
+                value = value.get(k)
+            else:
+                return None
+        return value if isinstance(value, str) else None
+
+    @classmethod
+    def get_button_text(cls, button_key: str, language: str = DEFAULT_LANGUAGE) -> str:
+        return cls.get_text(f'buttons.{button_key}', language)
+
+
+CASES = [
+    "get_text('buttons.back_to_menu', 'uz')",
+    "get_text('referral.points', 'ru', points=5)",
+    "get_button_text('my_stats', 'en')",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    setup_environment()
+    from utils.language_manager import LanguageManager
+    LegacyLanguageManager.load_translations()
+
+    print(f"{args.calls} calls each, best of 5")
+    for case in CASES:
+        assert eval(f"m.{case}", {"m": LegacyLanguageManager}) == eval(f"m.{case}", {"m": LanguageManager}), case
+        before, after = (
+            min(timeit.repeat(f"m.{case}", globals={"m": manager}, number=args.calls, repeat=5)) / args.calls * 1e9
+            for manager in (LegacyLanguageManager, LanguageManager)
+        )
+        print(f"  {case:45} before {before:6.0f} ns  after {after:6.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
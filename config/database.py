@@ -1,16 +1,55 @@
-import aiosqlite
-from supabase import create_client, Client
+from typing import Optional
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, create_async_client
 from config.settings import settings
+from database.sqlite_pool import sqlite_pool
+
+_supabase_client: Optional[AsyncClient] = None
+_supabase_http_client: Optional[httpx.AsyncClient] = None
 
 
 # Supabase client
-def get_supabase_client() -> Client:
-    return create_client(settings.supabase_url, settings.supabase_service_role_key)
+async def init_supabase_client() -> AsyncClient:
+    """Create the process-wide async Supabase client with a keep-alive connection pool"""
+    global _supabase_client, _supabase_http_client
+    if _supabase_client is not None:
+        return _supabase_client
+
+    _supabase_http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.supabase_max_connections,
+            max_keepalive_connections=settings.supabase_max_keepalive_connections,
+            keepalive_expiry=settings.supabase_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.supabase_timeout)
+    )
+    _supabase_client = await create_async_client(
+        settings.supabase_url,
+        settings.supabase_service_role_key,
+        options=AsyncClientOptions(httpx_client=_supabase_http_client)
+    )
+    return _supabase_client
+
+
+def get_supabase_client() -> AsyncClient:
+    """Get the shared async Supabase client"""
+    if _supabase_client is None:
+        raise RuntimeError("Supabase client is not initialized, call init_supabase_client() first")
+    return _supabase_client
+
+
+async def close_supabase_client():
+    """Close the Supabase client's HTTP connection pool"""
+    global _supabase_client, _supabase_http_client
+    if _supabase_http_client is not None:
+        await _supabase_http_client.aclose()
+    _supabase_client = None
+    _supabase_http_client = None
 
 
 # Initialize SQLite database
 async def init_sqlite_db():
-    async with aiosqlite.connect(settings.sqlite_db_path) as db:
+    async with sqlite_pool.writer() as db:
         # Create telegram_users table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS telegram_users (
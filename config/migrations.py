@@ -1,37 +1,290 @@
 import aiosqlite
+from typing import Awaitable, Callable, List, Tuple
 from config.settings import settings
+from database.sqlite_pool import sqlite_pool
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def migrate_add_language_column():
+async def migrate_add_language_column(db: aiosqlite.Connection):
     """Add language column to telegram_users table if it doesn't exist"""
-    try:
-        logger.info(f"Starting migration on database: {settings.sqlite_db_path}")
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            # Check if column exists
-            cursor = await db.execute(
-                "PRAGMA table_info(telegram_users)"
+    # Check if column exists
+    cursor = await db.execute(
+        "PRAGMA table_info(telegram_users)"
+    )
+    columns = await cursor.fetchall()
+    column_names = [col[1] for col in columns]
+    logger.info(f"Existing columns: {column_names}")
+
+    if 'language' not in column_names:
+        logger.info("Adding 'language' column to telegram_users table...")
+        await db.execute(
+            "ALTER TABLE telegram_users ADD COLUMN language VARCHAR(10) DEFAULT 'en'"
+        )
+        logger.info("✅ Successfully added 'language' column")
+    else:
+        logger.info("✅ 'language' column already exists")
+
+
+async def migrate_add_referral_and_broadcast_indexes(db: aiosqlite.Connection):
+    """Add covering indexes for referral lookups and broadcast recipient scans"""
+    # get_user_referrals and the referral sampling in deduct_points_and_remove_referrals
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_referred_by
+        ON telegram_users (referred_by, joined_channel, telegram_id, username, first_name, created_at)
+    """)
+
+    # Joined-channel scans such as count_unreachable_users
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_joined_channel
+        ON telegram_users (joined_channel, telegram_id)
+    """)
+
+
+async def migrate_add_broadcast_tables(db: aiosqlite.Connection):
+    """Add tables that persist broadcast jobs and per-recipient delivery progress"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id BIGINT NOT NULL,
+            from_chat_id BIGINT NOT NULL,
+            message_id BIGINT NOT NULL,
+            status VARCHAR(20) DEFAULT 'running',
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+
+    # A row is claimed ('sending') before the message goes out, so a resumed job never re-sends it
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER NOT NULL,
+            telegram_id BIGINT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            error TEXT,
+            PRIMARY KEY (job_id, telegram_id),
+            FOREIGN KEY (job_id) REFERENCES broadcast_jobs(id)
+        ) WITHOUT ROWID
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status
+        ON broadcast_jobs (status)
+    """)
+
+
+async def migrate_add_delivery_status(db: aiosqlite.Connection):
+    """Track users that can no longer receive messages and index active broadcast recipients"""
+    cursor = await db.execute("PRAGMA table_info(telegram_users)")
+    column_names = [col[1] for col in await cursor.fetchall()]
+
+    if 'delivery_status' not in column_names:
+        await db.execute(
+            "ALTER TABLE telegram_users ADD COLUMN delivery_status VARCHAR(20) DEFAULT 'active'"
+        )
+
+    # Recipient queries filter on delivery_status too, so the old index is superseded
+    await db.execute("DROP INDEX IF EXISTS idx_telegram_users_joined_channel")
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_recipients
+        ON telegram_users (joined_channel, delivery_status, telegram_id)
+    """)
+
+
+async def migrate_add_broadcast_segments(db: aiosqlite.Connection):
+    """Store segment filters and per-language variants on broadcast jobs, index segment columns"""
+    cursor = await db.execute("PRAGMA table_info(broadcast_jobs)")
+    column_names = [col[1] for col in await cursor.fetchall()]
+
+    if 'segment' not in column_names:
+        await db.execute("ALTER TABLE broadcast_jobs ADD COLUMN segment TEXT")
+    if 'variants' not in column_names:
+        await db.execute("ALTER TABLE broadcast_jobs ADD COLUMN variants TEXT")
+
+    # Segment columns ride along in the recipient indexes so filters never touch the table
+    await db.execute("DROP INDEX IF EXISTS idx_telegram_users_recipients")
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_recipients
+        ON telegram_users (joined_channel, delivery_status, telegram_id, language, points, created_at)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_recipients_language
+        ON telegram_users (joined_channel, delivery_status, language, telegram_id, points, created_at)
+    """)
+
+
+async def migrate_add_referral_counters(db: aiosqlite.Connection):
+    """Add denormalized referral counters to telegram_users and backfill them"""
+    cursor = await db.execute("PRAGMA table_info(telegram_users)")
+    column_names = [col[1] for col in await cursor.fetchall()]
+
+    if 'referral_count' not in column_names:
+        await db.execute("ALTER TABLE telegram_users ADD COLUMN referral_count INTEGER DEFAULT 0")
+    if 'successful_referral_count' not in column_names:
+        await db.execute("ALTER TABLE telegram_users ADD COLUMN successful_referral_count INTEGER DEFAULT 0")
+
+    # Both subqueries are answered from idx_telegram_users_referred_by
+    await db.execute("""
+        UPDATE telegram_users SET
+            referral_count = (
+                SELECT COUNT(*) FROM telegram_users r WHERE r.referred_by = telegram_users.telegram_id
+            ),
+            successful_referral_count = (
+                SELECT COUNT(*) FROM telegram_users r
+                WHERE r.referred_by = telegram_users.telegram_id AND r.joined_channel = 1
             )
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            logger.info(f"Existing columns: {column_names}")
-            
-            if 'language' not in column_names:
-                logger.info("Adding 'language' column to telegram_users table...")
-                await db.execute(
-                    "ALTER TABLE telegram_users ADD COLUMN language VARCHAR(10) DEFAULT 'en'"
-                )
-                await db.commit()
-                logger.info("✅ Successfully added 'language' column")
-            else:
-                logger.info("✅ 'language' column already exists")
-    except Exception as e:
-        logger.error(f"❌ Error during migration: {e}", exc_info=True)
-        raise
+    """)
+
+
+async def migrate_add_points_ledger(db: aiosqlite.Connection):
+    """Add the append-only points ledger and open it with the current balances"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id BIGINT NOT NULL,
+            delta INTEGER NOT NULL,
+            reason VARCHAR(32) NOT NULL,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (telegram_id) REFERENCES telegram_users(telegram_id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_points_ledger_user
+        ON points_ledger (telegram_id, id)
+    """)
+
+    # telegram_users.points stays the materialized balance; the opening rows make the ledger sum match it
+    await db.execute("""
+        INSERT OR IGNORE INTO points_ledger (telegram_id, delta, reason, idempotency_key)
+        SELECT telegram_id, points, 'opening_balance', 'opening:' || telegram_id
+        FROM telegram_users WHERE points != 0
+    """)
+
+
+async def migrate_add_leaderboard_index(db: aiosqlite.Connection):
+    """Index telegram_users in leaderboard order so top-N and rank queries are range scans"""
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_telegram_users_leaderboard
+        ON telegram_users (successful_referral_count DESC, points DESC, telegram_id)
+    """)
+
+
+async def migrate_add_referral_closure(db: aiosqlite.Connection):
+    """Add the referral closure table (every ancestor/descendant pair with its depth) and backfill it"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS referral_closure (
+            ancestor BIGINT NOT NULL,
+            descendant BIGINT NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant
+        ON referral_closure (descendant, depth, ancestor)
+    """)
+
+    # Walk up referred_by from every user; the depth cap and the self check stop on cycles in old data
+    await db.execute("""
+        INSERT OR IGNORE INTO referral_closure (ancestor, descendant, depth)
+        WITH RECURSIVE chain(ancestor, descendant, depth) AS (
+            SELECT telegram_id, telegram_id, 0 FROM telegram_users
+            UNION ALL
+            SELECT u.referred_by, chain.descendant, chain.depth + 1
+            FROM chain JOIN telegram_users u ON u.telegram_id = chain.ancestor
+            WHERE u.referred_by IS NOT NULL AND u.referred_by != chain.descendant AND chain.depth < 64
+        )
+        SELECT ancestor, descendant, MIN(depth) FROM chain GROUP BY ancestor, descendant
+    """)
+
+
+async def migrate_add_olympiads_page_index(db: aiosqlite.Connection):
+    """Index olympiads in listing order for keyset pagination on (created_at, id)"""
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_olympiads_created_at
+        ON olympiads (created_at, id)
+    """)
+
+
+async def migrate_add_fsm_storage(db: aiosqlite.Connection):
+    """Add the table backing the persistent FSM storage"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+    # TTL sweeper
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at
+        ON fsm_storage (updated_at)
+    """)
+
+
+# Ordered list of (version, name, step). Never renumber or edit an applied step, append a new one.
+MIGRATIONS: List[Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]] = [
+    (1, "add_language_column", migrate_add_language_column),
+    (2, "add_referral_and_broadcast_indexes", migrate_add_referral_and_broadcast_indexes),
+    (3, "add_broadcast_tables", migrate_add_broadcast_tables),
+    (4, "add_delivery_status", migrate_add_delivery_status),
+    (5, "add_broadcast_segments", migrate_add_broadcast_segments),
+    (6, "add_referral_counters", migrate_add_referral_counters),
+    (7, "add_points_ledger", migrate_add_points_ledger),
+    (8, "add_leaderboard_index", migrate_add_leaderboard_index),
+    (9, "add_referral_closure", migrate_add_referral_closure),
+    (10, "add_olympiads_page_index", migrate_add_olympiads_page_index),
+    (11, "add_fsm_storage", migrate_add_fsm_storage),
+]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Get the latest applied migration version"""
+    cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+    result = await cursor.fetchone()
+    return result[0] or 0
 
 
 async def run_migrations():
-    """Run all pending migrations"""
-    await migrate_add_language_column()
+    """Run all pending migrations, each in its own transaction"""
+    logger.info(f"Starting migrations on database: {settings.sqlite_db_path}")
+    async with sqlite_pool.writer() as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await db.commit()
+
+        current_version = await get_schema_version(db)
+        logger.info(f"Current schema version: {current_version}")
+
+        for version, name, step in MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            logger.info(f"Applying migration {version}: {name}")
+            try:
+                await db.execute("BEGIN IMMEDIATE")
+                await step(db)
+                await db.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
+                await db.commit()
+                logger.info(f"✅ Migration {version} applied")
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"❌ Error during migration {version} ({name}): {e}", exc_info=True)
+                raise
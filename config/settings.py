@@ -19,13 +19,51 @@ class Settings(BaseSettings):
     # Supabase settings
     supabase_url: str = Field(..., env="SUPABASE_URL")
     supabase_service_role_key: str = Field(..., env="SUPABASE_SERVICE_ROLE_KEY")
+    supabase_max_connections: int = Field(default=20, env="SUPABASE_MAX_CONNECTIONS")
+    supabase_max_keepalive_connections: int = Field(default=10, env="SUPABASE_MAX_KEEPALIVE_CONNECTIONS")
+    supabase_keepalive_expiry: float = Field(default=30.0, env="SUPABASE_KEEPALIVE_EXPIRY")  # Seconds
+    supabase_timeout: float = Field(default=10.0, env="SUPABASE_TIMEOUT")  # Seconds
 
     # SQLite settings
     sqlite_db_path: str = Field(default="bot_database.db", env="SQLITE_DB_PATH")
+    sqlite_pool_size: int = Field(default=4, env="SQLITE_POOL_SIZE")  # Reader connections
+    sqlite_busy_timeout_ms: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_cache_size_kb: int = Field(default=16384, env="SQLITE_CACHE_SIZE_KB")
+    sqlite_mmap_size: int = Field(default=268435456, env="SQLITE_MMAP_SIZE")
+    sqlite_write_batch_window_ms: int = Field(default=5, env="SQLITE_WRITE_BATCH_WINDOW_MS")
+    sqlite_write_batch_size: int = Field(default=100, env="SQLITE_WRITE_BATCH_SIZE")
+
+    # Cache settings
+    user_cache_size: int = Field(default=10000, env="USER_CACHE_SIZE")
+    user_cache_ttl: int = Field(default=300, env="USER_CACHE_TTL")  # Seconds
+    channel_member_cache_size: int = Field(default=10000, env="CHANNEL_MEMBER_CACHE_SIZE")
+    channel_member_cache_ttl: int = Field(default=300, env="CHANNEL_MEMBER_CACHE_TTL")  # Seconds
+    channel_nonmember_cache_ttl: int = Field(default=10, env="CHANNEL_NONMEMBER_CACHE_TTL")  # Seconds
+    registration_count_refresh_seconds: int = Field(default=30, env="REGISTRATION_COUNT_REFRESH_SECONDS")
+    leaderboard_size: int = Field(default=10, env="LEADERBOARD_SIZE")  # Referrers kept in the in-memory top list
 
     # Referral settings
     referral_points: int = Field(default=10, env="REFERRAL_POINTS")
 
+    # Olympiad list settings
+    olympiads_page_size: int = Field(default=8, env="OLYMPIADS_PAGE_SIZE")
+
+    # FSM storage settings
+    fsm_storage: str = Field(default="sqlite", env="FSM_STORAGE")  # sqlite or memory
+    fsm_flush_interval_ms: int = Field(default=100, env="FSM_FLUSH_INTERVAL_MS")
+    fsm_session_ttl: int = Field(default=604800, env="FSM_SESSION_TTL")  # Seconds an untouched session is kept
+    fsm_cache_idle_seconds: int = Field(default=600, env="FSM_CACHE_IDLE_SECONDS")
+    fsm_sweep_interval_seconds: int = Field(default=300, env="FSM_SWEEP_INTERVAL_SECONDS")
+    fsm_memory_max_entries: int = Field(default=10000, env="FSM_MEMORY_MAX_ENTRIES")
+    fsm_memory_max_bytes: int = Field(default=67108864, env="FSM_MEMORY_MAX_BYTES")  # 0 disables the byte cap
+    fsm_memory_idle_ttl: int = Field(default=3600, env="FSM_MEMORY_IDLE_TTL")  # Seconds
+
+    # Broadcast settings
+    broadcast_rate_per_second: float = Field(default=25, env="BROADCAST_RATE_PER_SECOND")  # Telegram allows ~30/s
+    broadcast_workers: int = Field(default=8, env="BROADCAST_WORKERS")
+    broadcast_max_retries: int = Field(default=3, env="BROADCAST_MAX_RETRIES")  # Retries after RetryAfter
+    broadcast_page_size: int = Field(default=500, env="BROADCAST_PAGE_SIZE")  # Recipients per keyset page
+
     # Admin settings
     admin_ids: List[int] = Field(default_factory=list)
 
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from database.sqlite_pool import sqlite_pool
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class OlympiadCatalog:
+    """Read-through in-memory snapshot of the olympiads table, replaced whole after every admin change"""
+
+    def __init__(self):
+        # (olympiads ordered like get_all_olympiads, olympiads by id); swapped as one tuple
+        self._snapshot: Optional[Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]] = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+        # (version, cursor_id, backwards, size) -> page; stale versions are never looked up again
+        self._pages = TTLCache(maxsize=256, ttl=3600)
+
+    @property
+    def version(self) -> int:
+        """Bumped every time the snapshot is replaced"""
+        return self._version
+
+    async def all(self) -> List[Dict[str, Any]]:
+        """All olympiads, newest first"""
+        olympiads, _ = await self._get_snapshot()
+        return [dict(olympiad) for olympiad in olympiads]
+
+    async def get(self, olympiad_id: str) -> Optional[Dict[str, Any]]:
+        """One olympiad by id"""
+        _, by_id = await self._get_snapshot()
+        olympiad = by_id.get(olympiad_id)
+        return dict(olympiad) if olympiad else None
+
+    async def page(self, cursor_id: Optional[str] = None, backwards: bool = False, size: int = 8) -> Dict[str, Any]:
+        """
+        One page of olympiads (newest first), keyset-paged on (created_at, id)
+
+        Args:
+            cursor_id: id of the last olympiad of the previous page (or the first one when backwards)
+            backwards: page towards newer olympiads
+
+        Returns:
+            {"olympiads": [...], "has_prev": bool, "has_next": bool}, shared and read-only
+        """
+        key = (self._version, cursor_id, backwards, size)
+        cached = self._pages.get(key)
+        if cached is not None:
+            return cached
+
+        version = self._version
+        _, by_id = await self._get_snapshot()
+        anchor = by_id.get(cursor_id) if cursor_id else None
+
+        async with sqlite_pool.reader() as db:
+            if anchor is None:
+                # First page, also used when the cursor olympiad was deleted meanwhile
+                cursor = await db.execute(
+                    "SELECT * FROM olympiads ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (size + 1,)
+                )
+            elif backwards:
+                cursor = await db.execute(
+                    """SELECT * FROM olympiads WHERE (created_at, id) > (?, ?)
+                       ORDER BY created_at, id LIMIT ?""",
+                    (anchor['created_at'], anchor['id'], size + 1)
+                )
+            else:
+                cursor = await db.execute(
+                    """SELECT * FROM olympiads WHERE (created_at, id) < (?, ?)
+                       ORDER BY created_at DESC, id DESC LIMIT ?""",
+                    (anchor['created_at'], anchor['id'], size + 1)
+                )
+            rows = [dict(row) for row in await cursor.fetchall()]
+
+        more = len(rows) > size
+        rows = rows[:size]
+        if anchor is not None and backwards:
+            page = {"olympiads": rows[::-1], "has_prev": more, "has_next": True}
+        else:
+            page = {"olympiads": rows, "has_prev": anchor is not None, "has_next": more}
+
+        if version == self._version:
+            self._pages.set(key, page)
+        return page
+
+    async def reload(self):
+        """Re-read the olympiads table and swap in the new snapshot"""
+        async with self._lock:
+            await self._load()
+
+    async def _get_snapshot(self) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        async with self._lock:
+            if self._snapshot is None:
+                await self._load()
+            return self._snapshot
+
+    async def _load(self):
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM olympiads ORDER BY created_at DESC, id DESC"
+            )
+            rows = await cursor.fetchall()
+
+        olympiads = [dict(row) for row in rows]
+        self._snapshot = (olympiads, {olympiad['id']: olympiad for olympiad in olympiads})
+        self._version += 1
+        self._pages.clear()
+        logger.info(f"Olympiad catalog loaded: {len(olympiads)} olympiads (version {self._version})")
+
+
+olympiad_catalog = OlympiadCatalog()
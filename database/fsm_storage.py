@@ -0,0 +1,338 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from config.settings import settings
+from database.sqlite_pool import SQLitePool, sqlite_pool
+from database.write_queue import WriteCoalescer, write_queue
+
+logger = logging.getLogger(__name__)
+
+
+def _deep_sizeof(value: Any, seen: Optional[Set[int]] = None) -> int:
+    """Approximate bytes held by a value and everything it contains"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
+
+
+def _encode_data(data: Dict[str, Any]) -> str:
+    # Compact JSON: FSM data only holds plain values, forms are stored as their fields
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at", "touched_at", "size")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+        self.touched_at = time.monotonic()
+        self.size = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage persisted in SQLite: reads are served from a hot cache, writes are flushed in batches"""
+
+    def __init__(
+            self,
+            pool: SQLitePool,
+            writes: WriteCoalescer,
+            flush_interval_ms: int,
+            session_ttl: float,
+            cache_idle: float,
+            sweep_interval: float
+    ):
+        self.pool = pool
+        self.writes = writes
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_ttl = session_ttl
+        self.cache_idle = cache_idle
+        self.sweep_interval = sweep_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the background flush and sweep loops"""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._flush_loop(), name="fsm-storage-flush"),
+            asyncio.create_task(self._sweep_loop(), name="fsm-storage-sweep"),
+        ]
+        logger.info(f"SQLite FSM storage started (flush every {self.flush_interval * 1000:.0f}ms)")
+
+    async def close(self) -> None:
+        """Stop the loops and persist everything still pending"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.data = dict(data)
+        self._mark_dirty(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.data.copy()
+
+    async def flush(self):
+        """Write all dirty keys in one transaction"""
+        if not self._dirty:
+            return
+
+        keys, self._dirty = self._dirty, set()
+        upserts: List[Tuple[str, Optional[str], str, float]] = []
+        deletes: List[Tuple[str]] = []
+        for storage_key in keys:
+            record = self._records.get(storage_key)
+            if record is None or record.is_empty:
+                deletes.append((storage_key,))
+                continue
+            try:
+                upserts.append((storage_key, record.state, _encode_data(record.data), record.updated_at))
+            except (TypeError, ValueError) as e:
+                logger.error(f"FSM data for {storage_key} is not serializable, keeping it in memory only: {e}")
+
+        async def op(db: aiosqlite.Connection):
+            if upserts:
+                await db.executemany(
+                    """INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (key) DO UPDATE SET
+                           state = excluded.state, data = excluded.data, updated_at = excluded.updated_at""",
+                    upserts
+                )
+            if deletes:
+                await db.executemany("DELETE FROM fsm_storage WHERE key = ?", deletes)
+
+        try:
+            await self.writes.submit(op)
+        except Exception as e:
+            logger.error(f"Error flushing {len(keys)} FSM keys, will retry: {e}")
+            self._dirty |= keys
+
+    async def sweep(self):
+        """Drop idle records from memory and abandoned sessions from the database"""
+        now = time.monotonic()
+        idle = [
+            storage_key for storage_key, record in self._records.items()
+            if storage_key not in self._dirty and now - record.touched_at > self.cache_idle
+        ]
+        for storage_key in idle:
+            del self._records[storage_key]
+
+        removed = await self.writes.execute(
+            "DELETE FROM fsm_storage WHERE updated_at < ?",
+            (time.time() - self.session_ttl,)
+        )
+        if idle or removed:
+            logger.info(f"FSM storage sweep: {len(idle)} evicted from cache, {removed} expired sessions removed")
+
+    def stats(self) -> Dict[str, int]:
+        """Cache size and pending writes"""
+        return {"cached": len(self._records), "dirty": len(self._dirty)}
+
+    def _mark_dirty(self, storage_key: str, record: _Record):
+        record.updated_at = time.time()
+        self._dirty.add(storage_key)
+
+    async def _get_record(self, storage_key: str) -> _Record:
+        record = self._records.get(storage_key)
+        if record is not None:
+            record.touched_at = time.monotonic()
+            return record
+
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT state, data, updated_at FROM fsm_storage WHERE key = ? AND updated_at >= ?",
+                (storage_key, time.time() - self.session_ttl)
+            )
+            row = await cursor.fetchone()
+
+        loaded = _Record(row[0], json.loads(row[1]), row[2]) if row else _Record()
+        # A write may have cached this key while we were reading, it is newer than the database
+        return self._records.setdefault(storage_key, loaded)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping FSM storage: {e}")
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """In-memory FSM storage capped by entry count and bytes, evicting least recently used and idle sessions"""
+
+    def __init__(self, max_entries: int, max_bytes: int, idle_ttl: float):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes  # 0 disables the byte cap
+        self.idle_ttl = idle_ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+
+        # Least recently touched first, so idle sessions are always at the front
+        self._records: "OrderedDict[str, _Record]" = OrderedDict()
+        self._bytes = 0
+
+        # Counters
+        self.evictions = 0
+        self.expirations = 0
+
+    async def start(self):
+        """Nothing to start, eviction happens inline on writes"""
+
+    async def close(self) -> None:
+        self._records.clear()
+        self._bytes = 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = self._get_record(storage_key) or _Record()
+        record.state = state.state if isinstance(state, State) else state
+        self._store(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get_record(self.key_builder.build(key))
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        record = self._get_record(storage_key) or _Record()
+        record.data = dict(data)
+        self._store(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get_record(self.key_builder.build(key))
+        return record.data.copy() if record else {}
+
+    def usage(self, key: StorageKey) -> int:
+        """Approximate bytes held by one session, 0 if it is not stored"""
+        record = self._records.get(self.key_builder.build(key))
+        return record.size if record else 0
+
+    def usage_by_state(self) -> Dict[Optional[str], int]:
+        """Approximate bytes held per FSM state, biggest first"""
+        usage: Dict[Optional[str], int] = {}
+        for record in self._records.values():
+            usage[record.state] = usage.get(record.state, 0) + record.size
+        return dict(sorted(usage.items(), key=lambda item: item[1], reverse=True))
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, bytes held and eviction counters"""
+        return {
+            "entries": len(self._records),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bytes_by_state": self.usage_by_state(),
+        }
+
+    def _get_record(self, storage_key: str) -> Optional[_Record]:
+        record = self._records.get(storage_key)
+        if record is None:
+            return None
+
+        now = time.monotonic()
+        if now - record.touched_at > self.idle_ttl:
+            self._remove(storage_key)
+            self.expirations += 1
+            return None
+
+        record.touched_at = now
+        self._records.move_to_end(storage_key)
+        return record
+
+    def _store(self, storage_key: str, record: _Record):
+        self._remove(storage_key)
+        if record.is_empty:
+            return
+
+        record.touched_at = time.monotonic()
+        record.size = _deep_sizeof(record.state) + _deep_sizeof(record.data)
+        self._records[storage_key] = record
+        self._bytes += record.size
+        self._evict()
+
+    def _remove(self, storage_key: str):
+        record = self._records.pop(storage_key, None)
+        if record is not None:
+            self._bytes -= record.size
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._records:
+            storage_key, record = next(iter(self._records.items()))
+            if now - record.touched_at > self.idle_ttl:
+                self.expirations += 1
+            elif len(self._records) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                if len(self._records) == 1:
+                    # Never drop the session that was just written, even if it alone is over the byte cap
+                    break
+                self.evictions += 1
+            else:
+                break
+            self._remove(storage_key)
+
+
+sqlite_storage = SQLiteStorage(
+    sqlite_pool,
+    write_queue,
+    settings.fsm_flush_interval_ms,
+    settings.fsm_session_ttl,
+    settings.fsm_cache_idle_seconds,
+    settings.fsm_sweep_interval_seconds
+)
+
+bounded_memory_storage = BoundedMemoryStorage(
+    settings.fsm_memory_max_entries,
+    settings.fsm_memory_max_bytes,
+    settings.fsm_memory_idle_ttl
+)
+
+# Storage the dispatcher uses, chosen with FSM_STORAGE
+fsm_storage = bounded_memory_storage if settings.fsm_storage == "memory" else sqlite_storage
@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import settings
+from database.sqlite_pool import sqlite_pool
+
+# Columns every leaderboard row carries; writers return them with RETURNING
+LEADERBOARD_COLUMNS = "telegram_id, username, first_name, successful_referral_count, points"
+
+
+def _sort_key(entry: Dict[str, Any]) -> Tuple[int, int, int]:
+    """Same order as idx_telegram_users_leaderboard"""
+    return -entry['successful_referral_count'], -entry['points'], entry['telegram_id']
+
+
+class ReferralLeaderboard:
+    """Top-N referrers kept in memory, seeded from the leaderboard index and updated on every counter change"""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._top: List[Dict[str, Any]] = []
+        self._loaded = False
+        self._version = 0
+
+    async def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the current top referrers, best first"""
+        if not self._loaded:
+            await self._load()
+        return [dict(entry) for entry in self._top[:limit or self.size]]
+
+    async def rank(self, user: Dict[str, Any]) -> Optional[int]:
+        """1-based rank of a telegram_users row, None if the user has no successful referrals"""
+        if not user.get('successful_referral_count'):
+            return None
+
+        if not self._loaded:
+            await self._load()
+        for position, entry in enumerate(self._top, start=1):
+            if entry['telegram_id'] == user['telegram_id']:
+                return position
+
+        # Outside the top-N: count users ahead of this one with a range scan of the index
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                """SELECT COUNT(*) FROM telegram_users
+                   WHERE successful_referral_count > ?
+                      OR (successful_referral_count = ? AND points > ?)
+                      OR (successful_referral_count = ? AND points = ? AND telegram_id < ?)""",
+                (
+                    user['successful_referral_count'],
+                    user['successful_referral_count'], user['points'],
+                    user['successful_referral_count'], user['points'], user['telegram_id']
+                )
+            )
+            result = await cursor.fetchone()
+            return result[0] + 1
+
+    def update(self, row: Optional[Dict[str, Any]]):
+        """Apply a committed change of one user's referral count or points"""
+        self._version += 1
+        if not row or not self._loaded:
+            return
+
+        entry = dict(row)
+        position = next((i for i, e in enumerate(self._top) if e['telegram_id'] == entry['telegram_id']), None)
+        was_full = len(self._top) >= self.size
+        floor_key = _sort_key(self._top[-1]) if self._top else None
+
+        if position is not None:
+            old_key = _sort_key(self._top.pop(position))
+            if was_full and _sort_key(entry) > old_key and _sort_key(entry) > floor_key:
+                # It fell below the old floor, a user outside the top-N may now rank higher
+                self._loaded = False
+                return
+        elif was_full and _sort_key(entry) > floor_key:
+            return
+
+        if entry['successful_referral_count'] > 0:
+            self._top.append(entry)
+            self._top.sort(key=_sort_key)
+            del self._top[self.size:]
+        elif was_full:
+            # A slot opened up that only the index can fill
+            self._loaded = False
+
+    def invalidate(self):
+        """Force the next read to reload from the index"""
+        self._loaded = False
+
+    async def _load(self):
+        version = self._version
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                f"""SELECT {LEADERBOARD_COLUMNS} FROM telegram_users
+                    WHERE successful_referral_count > 0
+                    ORDER BY successful_referral_count DESC, points DESC, telegram_id
+                    LIMIT ?""",
+                (self.size,)
+            )
+            rows = await cursor.fetchall()
+
+        self._top = [dict(row) for row in rows]
+        # A write that committed while we were reading may be missing, keep reloading until quiet
+        self._loaded = version == self._version
+
+
+leaderboard = ReferralLeaderboard(settings.leaderboard_size)
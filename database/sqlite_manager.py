@@ -1,7 +1,17 @@
 import aiosqlite
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from config.settings import settings
-import random
+from database.sqlite_pool import sqlite_pool
+from database.write_queue import write_queue
+from database.leaderboard import leaderboard, LEADERBOARD_COLUMNS
+from database.catalog import olympiad_catalog
+from utils.cache import TTLCache
+from utils.segments import BroadcastSegment
+import json
+import uuid
+
+# Cached telegram_users rows, kept coherent by invalidating on every mutator below
+user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
 
 
 class SQLiteManager:
@@ -13,7 +23,10 @@ class SQLiteManager:
             referred_by: Optional[int] = None
     ) -> bool:
         """Create a new user in the database"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        if referred_by == telegram_id:
+            referred_by = None  # Self-referral
+
+        async with sqlite_pool.writer() as db:
             try:
                 await db.execute(
                     """INSERT INTO telegram_users 
@@ -21,121 +34,272 @@ class SQLiteManager:
                        VALUES (?, ?, ?, ?)""",
                     (telegram_id, username, first_name, referred_by)
                 )
+                await db.execute(
+                    "INSERT OR IGNORE INTO referral_closure (ancestor, descendant, depth) VALUES (?, ?, 0)",
+                    (telegram_id, telegram_id)
+                )
+                if referred_by:
+                    await SQLiteManager._adjust_referral_counts(db, referred_by, 1, 0)
+                    await SQLiteManager._link_referral_subtree(db, telegram_id, referred_by)
                 await db.commit()
+                user_cache.invalidate(telegram_id)
+                if referred_by:
+                    user_cache.invalidate(referred_by)
                 return True
             except aiosqlite.IntegrityError:
                 return False  # User already exists
 
+    @staticmethod
+    async def _adjust_referral_counts(
+            db: aiosqlite.Connection,
+            referrer_id: int,
+            total: int,
+            successful: int
+    ) -> Optional[Dict[str, Any]]:
+        """Shift a referrer's denormalized counters inside the caller's transaction; returns its leaderboard row"""
+        cursor = await db.execute(
+            f"""UPDATE telegram_users
+                SET referral_count = referral_count + ?, successful_referral_count = successful_referral_count + ?
+                WHERE telegram_id = ?
+                RETURNING {LEADERBOARD_COLUMNS}""",
+            (total, successful, referrer_id)
+        )
+        rows = await cursor.fetchall()
+        return dict(rows[0]) if rows else None
+
+    @staticmethod
+    async def _link_referral_subtree(db: aiosqlite.Connection, telegram_id: int, referrer_id: int):
+        """Attach telegram_id and everyone below it under referrer_id in the closure table"""
+        # The referrer itself is listed explicitly since referred_by may point at a user we never stored
+        await db.execute(
+            """INSERT OR REPLACE INTO referral_closure (ancestor, descendant, depth)
+               SELECT up.ancestor, down.descendant, up.depth + down.depth + 1
+               FROM (
+                   SELECT ancestor, depth FROM referral_closure WHERE descendant = ? AND depth > 0
+                   UNION ALL SELECT ?, 0
+               ) AS up
+               CROSS JOIN (SELECT descendant, depth FROM referral_closure WHERE ancestor = ?) AS down""",
+            (referrer_id, referrer_id, telegram_id)
+        )
+
+    @staticmethod
+    async def _unlink_referral_subtrees(db: aiosqlite.Connection, telegram_ids: List[int]):
+        """Detach the subtrees rooted at telegram_ids from all of their ancestors in the closure table"""
+        if not telegram_ids:
+            return
+        placeholders = ", ".join("?" for _ in telegram_ids)
+        await db.execute(
+            f"""DELETE FROM referral_closure
+                WHERE descendant IN (SELECT descendant FROM referral_closure WHERE ancestor IN ({placeholders}))
+                AND ancestor NOT IN (SELECT descendant FROM referral_closure WHERE ancestor IN ({placeholders}))""",
+            (*telegram_ids, *telegram_ids)
+        )
+
     @staticmethod
     async def get_user(telegram_id: int) -> Optional[Dict[str, Any]]:
         """Get user by telegram_id"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            db.row_factory = aiosqlite.Row
+        cached = user_cache.get(telegram_id)
+        if cached is not None:
+            return dict(cached)
+
+        epoch = user_cache.epoch
+        async with sqlite_pool.reader() as db:
             cursor = await db.execute(
                 "SELECT * FROM telegram_users WHERE telegram_id = ?",
                 (telegram_id,)
             )
             row = await cursor.fetchone()
-            return dict(row) if row else None
+
+        if not row:
+            return None
+        user = dict(row)
+        user_cache.set(telegram_id, user, epoch=epoch)
+        return dict(user)
 
     @staticmethod
     async def update_channel_status(telegram_id: int, joined: bool = True) -> bool:
         """Update user's channel joining status"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            await db.execute(
-                "UPDATE telegram_users SET joined_channel = ? WHERE telegram_id = ?",
-                (joined, telegram_id)
+        async def op(db: aiosqlite.Connection) -> Optional[Dict[str, Any]]:
+            # Only a real transition moves the referrer's successful count
+            cursor = await db.execute(
+                """UPDATE telegram_users SET joined_channel = ?
+                   WHERE telegram_id = ? AND joined_channel IS NOT ?
+                   RETURNING referred_by""",
+                (joined, telegram_id, joined)
             )
-            await db.commit()
-            return True
+            rows = await cursor.fetchall()
+            if rows and rows[0][0]:
+                return await SQLiteManager._adjust_referral_counts(db, rows[0][0], 0, 1 if joined else -1)
+            return None
+
+        referrer = await write_queue.submit(op)
+        user_cache.invalidate(telegram_id)
+        if referrer:
+            user_cache.invalidate(referrer['telegram_id'])
+            leaderboard.update(referrer)
+        return True
 
     @staticmethod
-    async def add_referral_points(telegram_id: int, points: int) -> bool:
-        """Add points to user for successful referral"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            await db.execute(
-                "UPDATE telegram_users SET points = points + ? WHERE telegram_id = ?",
-                (points, telegram_id)
-            )
-            await db.commit()
-            return True
+    async def _append_points(
+            db: aiosqlite.Connection,
+            telegram_id: int,
+            delta: int,
+            reason: str,
+            idempotency_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Record a ledger entry and move the materialized balance; None if the key was already used
+
+        Raises LookupError for an unknown user, so the write queue rolls the ledger entry back with the op.
+        """
+        cursor = await db.execute(
+            """INSERT OR IGNORE INTO points_ledger (telegram_id, delta, reason, idempotency_key)
+               VALUES (?, ?, ?, ?)""",
+            (telegram_id, delta, reason, idempotency_key)
+        )
+        if cursor.rowcount == 0:
+            return None
+
+        cursor = await db.execute(
+            f"UPDATE telegram_users SET points = points + ? WHERE telegram_id = ? RETURNING {LEADERBOARD_COLUMNS}",
+            (delta, telegram_id)
+        )
+        rows = await cursor.fetchall()
+        if not rows:
+            raise LookupError(f"User {telegram_id} not found")
+        return dict(rows[0])
 
     @staticmethod
-    async def deduct_points_and_remove_referrals(telegram_id: int, points_to_deduct: int) -> bool:
-        """Deduct points and randomly remove corresponding referrals"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            try:
-                # Get current user points
-                cursor = await db.execute(
-                    "SELECT points FROM telegram_users WHERE telegram_id = ?",
-                    (telegram_id,)
-                )
-                result = await cursor.fetchone()
-                if not result or result[0] < points_to_deduct:
-                    return False
-
-                # Get referrals made by this user
-                cursor = await db.execute(
-                    "SELECT telegram_id FROM telegram_users WHERE referred_by = ? AND joined_channel = 1",
-                    (telegram_id,)
-                )
-                referrals = await cursor.fetchall()
-
-                # Calculate how many referrals to remove (assuming each referral = 10 points)
-                referrals_to_remove = points_to_deduct // settings.referral_points
-
-                if len(referrals) >= referrals_to_remove:
-                    # Randomly select referrals to remove
-                    to_remove = random.sample(referrals, referrals_to_remove)
-
-                    # Remove selected referrals
-                    # Unlink selected referrals (set referred_by to NULL)
-                    for referral in to_remove:
-                        await db.execute(
-                            "UPDATE telegram_users SET referred_by = NULL WHERE telegram_id = ?",
-                            (referral[0],)
-                        )
-
-                    # Deduct points
-                    await db.execute(
-                        "UPDATE telegram_users SET points = points - ? WHERE telegram_id = ?",
-                        (points_to_deduct, telegram_id)
-                    )
+    async def add_referral_points(telegram_id: int, points: int, referee_id: int) -> bool:
+        """Add points to user for referring referee_id; False if this referral was already credited or the user is gone"""
+        async def op(db: aiosqlite.Connection) -> Optional[Dict[str, Any]]:
+            return await SQLiteManager._append_points(
+                db, telegram_id, points, 'referral', f"referral:{telegram_id}:{referee_id}"
+            )
 
-                    await db.commit()
-                    return True
-                else:
-                    return False
+        try:
+            row = await write_queue.submit(op)
+        except LookupError:
+            return False
+        if row is None:
+            return False
+        user_cache.invalidate(telegram_id)
+        leaderboard.update(row)
+        return True
 
-            except Exception as e:
-                await db.rollback()
-                return False
+    @staticmethod
+    async def points_entry_exists(idempotency_key: str) -> bool:
+        """Check if a ledger entry was already recorded under idempotency_key"""
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT 1 FROM points_ledger WHERE idempotency_key = ?",
+                (idempotency_key,)
+            )
+            return await cursor.fetchone() is not None
 
     @staticmethod
-    async def get_user_referrals(telegram_id: int) -> List[Dict[str, Any]]:
-        """Get all users referred by this user"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def deduct_points_and_remove_referrals(
+            telegram_id: int,
+            points_to_deduct: int,
+            idempotency_key: Optional[str] = None,
+            reason: str = 'deduction'
+    ) -> bool:
+        """
+        Deduct points and randomly remove corresponding referrals in one transaction
+
+        Replaying an already applied idempotency_key succeeds without charging again.
+        """
+        # Calculate how many referrals to remove (assuming each referral = 10 points)
+        referrals_to_remove = points_to_deduct // settings.referral_points
+        idempotency_key = idempotency_key or f"{reason}:{telegram_id}:{uuid.uuid4().hex}"
+
+        async def op(db: aiosqlite.Connection) -> Optional[Tuple[Optional[Dict[str, Any]], List[int]]]:
             cursor = await db.execute(
-                """SELECT telegram_id, username, first_name, joined_channel, created_at 
-                   FROM telegram_users WHERE referred_by = ?""",
-                (telegram_id,)
+                "SELECT 1 FROM points_ledger WHERE idempotency_key = ?",
+                (idempotency_key,)
+            )
+            if await cursor.fetchone():
+                return None, []
+
+            # The balance check and the deduction are one statement, so concurrent calls can't double spend
+            cursor = await db.execute(
+                f"""UPDATE telegram_users
+                    SET points = points - ?,
+                        referral_count = referral_count - ?,
+                        successful_referral_count = successful_referral_count - ?
+                    WHERE telegram_id = ? AND points >= ? AND successful_referral_count >= ?
+                    RETURNING {LEADERBOARD_COLUMNS}""",
+                (points_to_deduct, referrals_to_remove, referrals_to_remove,
+                 telegram_id, points_to_deduct, referrals_to_remove)
             )
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            if not rows:
+                return None
+
+            # Unlink a random sample of successful referrals (set referred_by to NULL)
+            cursor = await db.execute(
+                """UPDATE telegram_users SET referred_by = NULL
+                   WHERE telegram_id IN (
+                       SELECT telegram_id FROM telegram_users
+                       WHERE referred_by = ? AND joined_channel = 1
+                       ORDER BY RANDOM() LIMIT ?
+                   )
+                   RETURNING telegram_id""",
+                (telegram_id, referrals_to_remove)
+            )
+            removed = [row[0] for row in await cursor.fetchall()]
+            if len(removed) != referrals_to_remove:
+                # Counters disagree with the referral rows; roll this op back
+                raise RuntimeError(f"Expected {referrals_to_remove} referrals of {telegram_id}, found {len(removed)}")
+            await SQLiteManager._unlink_referral_subtrees(db, removed)
+
+            # The balance was already moved above, only the ledger entry is left
+            await db.execute(
+                """INSERT INTO points_ledger (telegram_id, delta, reason, idempotency_key)
+                   VALUES (?, ?, ?, ?)""",
+                (telegram_id, -points_to_deduct, reason, idempotency_key)
+            )
+            return dict(rows[0]), removed
+
+        try:
+            result = await write_queue.submit(op)
+        except Exception:
+            return False
+        if result is None:
+            return False
+
+        row, removed = result
+        user_cache.invalidate(telegram_id)
+        for referral_id in removed:
+            user_cache.invalidate(referral_id)
+        leaderboard.update(row)
+        return True
 
     @staticmethod
-    async def get_all_users() -> List[int]:
-        """Get all user telegram_ids for broadcasting"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            cursor = await db.execute("SELECT telegram_id FROM telegram_users WHERE joined_channel = 1")
+    async def get_user_referrals(
+            telegram_id: int,
+            limit: Optional[int] = None,
+            successful_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get users referred by this user (use referral_count columns for totals)"""
+        query = """SELECT telegram_id, username, first_name, joined_channel, created_at 
+                   FROM telegram_users WHERE referred_by = ?"""
+        params: List[Any] = [telegram_id]
+        if successful_only:
+            query += " AND joined_channel = 1"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+            return [dict(row) for row in rows]
 
     @staticmethod
     async def user_exists(telegram_id: int) -> bool:
         """Check if user exists in database"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        async with sqlite_pool.reader() as db:
             cursor = await db.execute(
                 "SELECT 1 FROM telegram_users WHERE telegram_id = ?",
                 (telegram_id,)
@@ -162,7 +326,7 @@ class SQLiteManager:
             price: int = 0
     ) -> bool:
         """Create a new olympiad in SQLite"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        async with sqlite_pool.writer() as db:
             try:
                 await db.execute(
                     """INSERT INTO olympiads 
@@ -171,95 +335,354 @@ class SQLiteManager:
                     (olympiad_id, title, subject, date, link, registration_limit, price)
                 )
                 await db.commit()
-                return True
             except aiosqlite.IntegrityError:
                 return False  # Olympiad with this ID already exists
 
+        await olympiad_catalog.reload()
+        return True
+
     @staticmethod
     async def get_all_olympiads() -> List[Dict[str, Any]]:
-        """Get all olympiads from SQLite"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM olympiads ORDER BY created_at DESC"
-            )
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        """Get all olympiads (from the in-memory catalog)"""
+        return await olympiad_catalog.all()
+
+    @staticmethod
+    async def get_olympiads_page(
+            cursor_id: Optional[str] = None,
+            backwards: bool = False,
+            size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Get one page of olympiads, keyset-paged on (created_at, id) and cached per catalog version"""
+        return await olympiad_catalog.page(cursor_id, backwards, size or settings.olympiads_page_size)
 
     @staticmethod
     async def get_olympiad_by_id(olympiad_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific olympiad by ID from SQLite"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM olympiads WHERE id = ?",
-                (olympiad_id,)
-            )
-            row = await cursor.fetchone()
-            return dict(row) if row else None
+        """Get specific olympiad by ID (from the in-memory catalog)"""
+        return await olympiad_catalog.get(olympiad_id)
 
     @staticmethod
     async def delete_olympiad(olympiad_id: str) -> bool:
         """Delete olympiad from SQLite"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        async with sqlite_pool.writer() as db:
             cursor = await db.execute(
                 "DELETE FROM olympiads WHERE id = ?",
                 (olympiad_id,)
             )
             await db.commit()
-            return cursor.rowcount > 0
+
+        await olympiad_catalog.reload()
+        return cursor.rowcount > 0
 
     @staticmethod
     async def update_olympiad_price(olympiad_id: str, price: int) -> bool:
         """Update olympiad price"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        async with sqlite_pool.writer() as db:
             cursor = await db.execute(
                 "UPDATE olympiads SET price = ? WHERE id = ?",
                 (price, olympiad_id)
             )
             await db.commit()
-            return cursor.rowcount > 0
+
+        await olympiad_catalog.reload()
+        return cursor.rowcount > 0
 
     @staticmethod
     async def update_olympiad_limit(olympiad_id: str, limit: Optional[int]) -> bool:
         """Update olympiad registration limit"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        async with sqlite_pool.writer() as db:
             cursor = await db.execute(
                 "UPDATE olympiads SET registration_limit = ? WHERE id = ?",
                 (limit, olympiad_id)
             )
             await db.commit()
-            return cursor.rowcount > 0
+
+        await olympiad_catalog.reload()
+        return cursor.rowcount > 0
 
     @staticmethod
     async def update_user_referrer(telegram_id: int, referrer_id: int) -> bool:
-        """Update user's referrer (for re-referrals)"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        """Update user's referrer (for re-referrals); False if it would create a referral cycle"""
+        async def op(db: aiosqlite.Connection) -> Optional[List[Dict[str, Any]]]:
+            cursor = await db.execute(
+                "SELECT referred_by, joined_channel FROM telegram_users WHERE telegram_id = ?",
+                (telegram_id,)
+            )
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            if row[0] == referrer_id:
+                return []
+
+            # The new referrer must not be the user or anyone the user brought in
+            cursor = await db.execute(
+                "SELECT 1 FROM referral_closure WHERE ancestor = ? AND descendant = ?",
+                (telegram_id, referrer_id)
+            )
+            if await cursor.fetchone() or referrer_id == telegram_id:
+                return None
+
+            old_referrer_id, joined = row[0], 1 if row[1] else 0
             await db.execute(
                 "UPDATE telegram_users SET referred_by = ? WHERE telegram_id = ?",
                 (referrer_id, telegram_id)
             )
-            await db.commit()
-            return True
+            referrers = []
+            if old_referrer_id:
+                referrers.append(await SQLiteManager._adjust_referral_counts(db, old_referrer_id, -1, -joined))
+            referrers.append(await SQLiteManager._adjust_referral_counts(db, referrer_id, 1, joined))
+
+            await SQLiteManager._unlink_referral_subtrees(db, [telegram_id])
+            await SQLiteManager._link_referral_subtree(db, telegram_id, referrer_id)
+            return [referrer for referrer in referrers if referrer]
+
+        referrers = await write_queue.submit(op)
+        if referrers is None:
+            return False
+        user_cache.invalidate(telegram_id)
+        user_cache.invalidate(referrer_id)
+        for referrer in referrers:
+            user_cache.invalidate(referrer['telegram_id'])
+            leaderboard.update(referrer)
+        return True
+
+    @staticmethod
+    async def get_referral_tree_stats(telegram_id: int) -> Dict[str, Any]:
+        """Get a user's referral network size per level and their upline, straight from the closure table"""
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                """SELECT depth, COUNT(*) FROM referral_closure
+                   WHERE ancestor = ? AND depth > 0
+                   GROUP BY depth ORDER BY depth""",
+                (telegram_id,)
+            )
+            levels = {row[0]: row[1] for row in await cursor.fetchall()}
+
+            cursor = await db.execute(
+                """SELECT ancestor FROM referral_closure
+                   WHERE descendant = ? AND depth > 0
+                   ORDER BY depth""",
+                (telegram_id,)
+            )
+            upline = [row[0] for row in await cursor.fetchall()]
+
+        return {
+            "direct": levels.get(1, 0),
+            "total": sum(levels.values()),
+            "levels": levels,
+            "depth": len(upline),
+            "upline": upline
+        }
+
+    @staticmethod
+    async def get_referral_leaderboard(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the top referrers (successful referrals, then points)"""
+        return await leaderboard.top(limit)
+
+    @staticmethod
+    async def get_referral_rank(user: Dict[str, Any]) -> Optional[int]:
+        """Get a user's leaderboard rank, None if they have no successful referrals"""
+        return await leaderboard.rank(user)
 
     @staticmethod
     async def set_user_language(telegram_id: int, language: str) -> bool:
         """Set user's language preference"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
-            await db.execute(
-                "UPDATE telegram_users SET language = ? WHERE telegram_id = ?",
-                (language, telegram_id)
-            )
-            await db.commit()
-            return True
+        await write_queue.execute(
+            "UPDATE telegram_users SET language = ? WHERE telegram_id = ?",
+            (language, telegram_id)
+        )
+        user_cache.invalidate(telegram_id)
+        return True
 
     @staticmethod
     async def get_user_language(telegram_id: int) -> str:
         """Get user's language preference, default to 'en'"""
-        async with aiosqlite.connect(settings.sqlite_db_path) as db:
+        user = await SQLiteManager.get_user(telegram_id)
+        return user['language'] if user else 'en'
+
+    # BROADCAST METHODS
+    @staticmethod
+    def _segment_filter(segment: Optional[BroadcastSegment], language: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause (on alias u) selecting reachable users of a broadcast segment"""
+        clauses = ["u.joined_channel = 1", "u.delivery_status = 'active'"]
+        params: List[Any] = []
+
+        if language is not None:
+            clauses.append("u.language = ?")
+            params.append(language)
+        elif segment and segment.languages:
+            clauses.append(f"u.language IN ({', '.join('?' for _ in segment.languages)})")
+            params.extend(segment.languages)
+
+        if segment:
+            if segment.min_points is not None:
+                clauses.append("u.points >= ?")
+                params.append(segment.min_points)
+            if segment.max_points is not None:
+                clauses.append("u.points <= ?")
+                params.append(segment.max_points)
+            if segment.created_after:
+                clauses.append("u.created_at >= ?")
+                params.append(segment.created_after)
+            if segment.created_before:
+                clauses.append("u.created_at < date(?, '+1 day')")
+                params.append(segment.created_before)
+            if segment.min_referrals is not None:
+                clauses.append("u.referral_count >= ?")
+                params.append(segment.min_referrals)
+
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    async def create_broadcast_job(
+            admin_id: int,
+            from_chat_id: int,
+            message_id: int,
+            segment: Optional[BroadcastSegment] = None,
+            variants: Optional[Dict[str, int]] = None
+    ) -> int:
+        """Create a broadcast job and return its id"""
+        total = await SQLiteManager.count_broadcast_recipients(segment)
+        async with sqlite_pool.writer() as db:
             cursor = await db.execute(
-                "SELECT language FROM telegram_users WHERE telegram_id = ?",
-                (telegram_id,)
+                """INSERT INTO broadcast_jobs (admin_id, from_chat_id, message_id, total, segment, variants)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (
+                    admin_id, from_chat_id, message_id, total,
+                    segment.to_json() if segment else None,
+                    json.dumps(variants) if variants else None
+                )
+            )
+            await db.commit()
+            return cursor.lastrowid
+
+    @staticmethod
+    async def get_broadcast_job(job_id: int) -> Optional[Dict[str, Any]]:
+        """Get broadcast job by id"""
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM broadcast_jobs WHERE id = ?",
+                (job_id,)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
+    @staticmethod
+    async def get_running_broadcast_jobs() -> List[Dict[str, Any]]:
+        """Get broadcast jobs that have not finished (e.g. interrupted by a restart)"""
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id"
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+    @staticmethod
+    async def count_broadcast_recipients(segment: Optional[BroadcastSegment] = None) -> int:
+        """Count users a broadcast to this segment would be sent to"""
+        where, params = SQLiteManager._segment_filter(segment)
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(f"SELECT COUNT(*) FROM telegram_users u WHERE {where}", params)
+            result = await cursor.fetchone()
+            return result[0]
+
+    @staticmethod
+    async def iter_pending_broadcast_recipients(
+            job_id: int,
+            segment: Optional[BroadcastSegment] = None,
+            page_size: int = 500
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Stream (telegram_id, language) of segment users not yet attempted by the job.
+
+        Each language of the segment is paged separately with keyset pagination on telegram_id,
+        so every page is one bounded range scan of the per-language index.
+        """
+        languages = segment.languages if segment and segment.languages else [None]
+        for language in languages:
+            where, params = SQLiteManager._segment_filter(segment, language)
+            last_id = -2 ** 63
+            while True:
+                async with sqlite_pool.reader() as db:
+                    cursor = await db.execute(
+                        f"""SELECT u.telegram_id, u.language FROM telegram_users u
+                            WHERE {where} AND u.telegram_id > ?
+                            AND NOT EXISTS (
+                                SELECT 1 FROM broadcast_deliveries d
+                                WHERE d.job_id = ? AND d.telegram_id = u.telegram_id
+                            )
+                            ORDER BY u.telegram_id LIMIT ?""",
+                        (*params, last_id, job_id, page_size)
+                    )
+                    rows = await cursor.fetchall()
+
+                for row in rows:
+                    yield row[0], row[1]
+                if len(rows) < page_size:
+                    break
+                last_id = rows[-1][0]
+
+    @staticmethod
+    async def mark_user_unreachable(telegram_id: int, status: str) -> bool:
+        """Record that messages to this user fail permanently ('blocked' or 'not_found')"""
+        await write_queue.execute(
+            "UPDATE telegram_users SET delivery_status = ? WHERE telegram_id = ?",
+            (status, telegram_id)
+        )
+        user_cache.invalidate(telegram_id)
+        return True
+
+    @staticmethod
+    async def mark_user_reachable(telegram_id: int) -> bool:
+        """Put a user back into broadcast audiences after they contacted the bot again"""
+        await write_queue.execute(
+            "UPDATE telegram_users SET delivery_status = 'active' WHERE telegram_id = ?",
+            (telegram_id,)
+        )
+        user_cache.invalidate(telegram_id)
+        return True
+
+    @staticmethod
+    async def count_unreachable_users() -> int:
+        """Count users pruned from broadcasts because they blocked the bot or were deleted"""
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) FROM telegram_users WHERE joined_channel = 1 AND delivery_status != 'active'"
             )
             result = await cursor.fetchone()
-            return result[0] if result else 'en'
\ No newline at end of file
+            return result[0]
+
+    @staticmethod
+    async def claim_broadcast_delivery(job_id: int, telegram_id: int) -> bool:
+        """Mark a recipient as being sent to; False if it was already attempted"""
+        rowcount = await write_queue.execute(
+            """INSERT OR IGNORE INTO broadcast_deliveries (job_id, telegram_id, status)
+               VALUES (?, ?, 'sending')""",
+            (job_id, telegram_id)
+        )
+        return rowcount > 0
+
+    @staticmethod
+    async def finish_broadcast_delivery(job_id: int, telegram_id: int, sent: bool, error: Optional[str] = None) -> bool:
+        """Record the outcome of a broadcast delivery (also for recipients whose claim never committed)"""
+        await write_queue.execute(
+            """INSERT INTO broadcast_deliveries (job_id, telegram_id, status, error) VALUES (?, ?, ?, ?)
+               ON CONFLICT (job_id, telegram_id) DO UPDATE SET status = excluded.status, error = excluded.error""",
+            (job_id, telegram_id, 'sent' if sent else 'failed', error)
+        )
+        return True
+
+    @staticmethod
+    async def complete_broadcast_job(job_id: int) -> Optional[Dict[str, Any]]:
+        """Store final delivery counters on the job and mark it completed"""
+        async with sqlite_pool.writer() as db:
+            await db.execute(
+                """UPDATE broadcast_jobs SET
+                       status = 'completed',
+                       sent = (SELECT COUNT(*) FROM broadcast_deliveries WHERE job_id = ? AND status = 'sent'),
+                       failed = (SELECT COUNT(*) FROM broadcast_deliveries WHERE job_id = ? AND status != 'sent'),
+                       finished_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (job_id, job_id, job_id)
+            )
+            await db.commit()
+        return await SQLiteManager.get_broadcast_job(job_id)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+import aiosqlite
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePool:
+    """Long-lived SQLite connections: one serialized writer plus N WAL readers"""
+
+    def __init__(self, db_path: str, readers: int):
+        self.db_path = db_path
+        self.readers_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.db_path)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms}")
+        await db.execute("PRAGMA journal_mode = WAL")
+        # The writer fsyncs every commit so acknowledged writes survive a crash; the write queue's
+        # group commit pays that fsync once per batch. Readers never commit, NORMAL is enough for them
+        await db.execute(f"PRAGMA synchronous = {'NORMAL' if read_only else 'FULL'}")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        await db.execute(f"PRAGMA cache_size = -{settings.sqlite_cache_size_kb}")
+        await db.execute(f"PRAGMA mmap_size = {settings.sqlite_mmap_size}")
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        return db
+
+    async def open(self):
+        """Open the writer and reader connections"""
+        if self.is_open:
+            return
+
+        self._writer = await self._connect(read_only=False)
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.readers_count):
+            reader = await self._connect(read_only=True)
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+
+        logger.info(f"SQLite pool opened on {self.db_path} (1 writer, {self.readers_count} readers)")
+
+    async def close(self):
+        """Close all pooled connections"""
+        if not self.is_open:
+            return
+
+        async with self._writer_lock:
+            await self._writer.close()
+            self._writer = None
+
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._idle_readers = None
+        logger.info("SQLite pool closed")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow the single writer connection; uncommitted work is rolled back on release"""
+        if not self.is_open:
+            raise RuntimeError("SQLite pool is not open")
+
+        async with self._writer_lock:
+            db = self._writer
+            try:
+                yield db
+            finally:
+                if db.in_transaction:
+                    await db.rollback()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        if not self.is_open:
+            raise RuntimeError("SQLite pool is not open")
+
+        idle_readers = self._idle_readers
+        db = await idle_readers.get()
+        try:
+            yield db
+        finally:
+            idle_readers.put_nowait(db)
+
+
+sqlite_pool = SQLitePool(settings.sqlite_db_path, settings.sqlite_pool_size)
@@ -1,19 +1,78 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from config.database import get_supabase_client
+from config.settings import settings
+import asyncio
 import logging
+import time
 import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
+class RegistrationCountCache:
+    """Local per-olympiad registration counters, refreshed from Supabase periodically"""
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._counts: Dict[str, Tuple[int, float]] = {}  # olympiad_id -> (count, refreshed_at)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def peek(self, olympiad_id: str) -> Optional[int]:
+        """Get the local counter if it is still fresh"""
+        entry = self._counts.get(olympiad_id)
+        if entry is None or time.monotonic() - entry[1] > self.refresh_interval:
+            return None
+        return entry[0]
+
+    def set(self, olympiad_id: str, count: int):
+        """Replace the counter with an authoritative value"""
+        self._counts[olympiad_id] = (count, time.monotonic())
+
+    def increment(self, olympiad_id: str, delta: int = 1):
+        """Account for a registration completed by this process"""
+        entry = self._counts.get(olympiad_id)
+        if entry is not None:
+            self._counts[olympiad_id] = (entry[0] + delta, entry[1])
+
+    def invalidate(self, olympiad_id: Optional[str] = None):
+        """Force the next read to refresh from Supabase"""
+        if olympiad_id is None:
+            self._counts.clear()
+        else:
+            self._counts.pop(olympiad_id, None)
+
+    async def refresh(self, olympiad_id: str) -> int:
+        """Refresh one counter from Supabase; concurrent refreshes share one request"""
+        task = self._refreshing.get(olympiad_id)
+        if task is None:
+            task = asyncio.create_task(SupabaseManager.fetch_olympiad_registrations_count(olympiad_id))
+            task.add_done_callback(lambda t: self._store_refresh(olympiad_id, t))
+            self._refreshing[olympiad_id] = task
+
+        count = await asyncio.shield(task)
+        if count is None:
+            # Remote count failed, fall back to whatever we had
+            entry = self._counts.get(olympiad_id)
+            return entry[0] if entry else 0
+        return count
+
+    def _store_refresh(self, olympiad_id: str, task: asyncio.Task):
+        self._refreshing.pop(olympiad_id, None)
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self.set(olympiad_id, task.result())
+
+
+registration_counts = RegistrationCountCache(settings.registration_count_refresh_seconds)
+
+
 class SupabaseManager:
     @staticmethod
     async def get_upcoming_olympiads() -> List[Dict[str, Any]]:
         """Fetch upcoming olympiads from Supabase"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiads").select("*").eq("status", "upcoming").execute()
+            response = await supabase.table("olympiads").select("*").eq("status", "upcoming").execute()
             return response.data
         except Exception as e:
             logger.error(f"Error fetching olympiads: {e}")
@@ -24,7 +83,7 @@ class SupabaseManager:
         """Get specific olympiad by ID"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiads").select("*").eq("id", olympiad_id).execute()
+            response = await supabase.table("olympiads").select("*").eq("id", olympiad_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error fetching olympiad {olympiad_id}: {e}")
@@ -35,7 +94,7 @@ class SupabaseManager:
         """Check if email exists in profiles table"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("profiles").select("*").eq("email", email).execute()
+            response = await supabase.table("profiles").select("*").eq("email", email).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error checking email {email}: {e}")
@@ -46,7 +105,7 @@ class SupabaseManager:
         """Check if user is already registered for this olympiad"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiad_participants").select("id").eq("user_id", user_id).eq("olympiad_id",
+            response = await supabase.table("olympiad_participants").select("id").eq("user_id", user_id).eq("olympiad_id",
                                                                                                       olympiad_id).execute()
             return len(response.data) > 0
         except Exception as e:
@@ -92,7 +151,9 @@ class SupabaseManager:
                 "updated_at": datetime.now().isoformat()
             }
 
-            response = supabase.table("olympiad_participants").insert(registration_data).execute()
+            response = await supabase.table("olympiad_participants").insert(registration_data).execute()
+            if response.data:
+                registration_counts.increment(olympiad_id)
             return len(response.data) > 0
 
         except Exception as e:
@@ -104,30 +165,65 @@ class SupabaseManager:
         """Get olympiad price in points"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiads").select("price").eq("id", olympiad_id).execute()
+            response = await supabase.table("olympiads").select("price").eq("id", olympiad_id).execute()
             return response.data[0]["price"] if response.data else 0
         except Exception as e:
             logger.error(f"Error getting olympiad price: {e}")
             return 0
 
     @staticmethod
-    async def get_olympiad_registrations_count(olympiad_id: str) -> int:
-        """Get current number of registrations for olympiad"""
+    async def get_olympiad_registrations_count(olympiad_id: str, fresh: bool = False) -> int:
+        """Get current number of registrations for olympiad (from the local counter unless fresh)"""
+        if not fresh:
+            count = registration_counts.peek(olympiad_id)
+            if count is not None:
+                return count
+        return await registration_counts.refresh(olympiad_id)
+
+    @staticmethod
+    async def fetch_olympiad_registrations_count(olympiad_id: str) -> Optional[int]:
+        """Count registrations for olympiad in Supabase, None on error"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiad_participants").select("id", count="exact").eq("olympiad_id",
-                                                                                              olympiad_id).execute()
+            response = await supabase.table("olympiad_participants").select("id", count="exact", head=True).eq(
+                "olympiad_id", olympiad_id).execute()
             return response.count or 0
         except Exception as e:
             logger.error(f"Error getting registrations count: {e}")
-            return 0
+            return None
+
+    @staticmethod
+    async def get_olympiads_stats(olympiad_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get price, limit and registrations count for many olympiads in one request"""
+        if not olympiad_ids:
+            return {}
+        try:
+            supabase = get_supabase_client()
+            response = await supabase.table("olympiads").select(
+                "id, price, registration_limit, olympiad_participants(count)"
+            ).in_("id", list(olympiad_ids)).execute()
+        except Exception as e:
+            logger.error(f"Error getting olympiads stats: {e}")
+            return {}
+
+        stats = {}
+        for row in response.data:
+            participants = row.get("olympiad_participants") or [{"count": 0}]
+            registrations = participants[0]["count"]
+            registration_counts.set(row["id"], registrations)
+            stats[row["id"]] = {
+                "price": row.get("price") or 0,
+                "registration_limit": row.get("registration_limit"),
+                "registrations": registrations
+            }
+        return stats
 
     @staticmethod
     async def get_olympiad_limit(olympiad_id: str) -> Optional[int]:
         """Get olympiad registration limit"""
         try:
             supabase = get_supabase_client()
-            response = supabase.table("olympiads").select("registration_limit").eq("id", olympiad_id).execute()
+            response = await supabase.table("olympiads").select("registration_limit").eq("id", olympiad_id).execute()
             return response.data[0]["registration_limit"] if response.data else None
         except Exception as e:
             logger.error(f"Error getting olympiad limit: {e}")
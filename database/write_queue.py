@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import aiosqlite
+from config.settings import settings
+from database.sqlite_pool import SQLitePool, sqlite_pool
+
+logger = logging.getLogger(__name__)
+
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class WriteCoalescer:
+    """Background queue that group-commits small SQLite writes in one transaction"""
+
+    def __init__(self, pool: SQLitePool, window_ms: int, max_batch: int, latency_samples: int = 1000):
+        self.pool = pool
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.writes_total = 0
+        self.writes_failed = 0
+        self.batches_total = 0
+        self._started_at: Optional[float] = None
+        self._latencies = deque(maxlen=latency_samples)
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the background flush loop"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run(), name="sqlite-write-coalescer")
+        logger.info(f"Write coalescer started (window={self.window * 1000:.0f}ms, batch={self.max_batch})")
+
+    async def stop(self):
+        """Flush pending writes and stop the loop"""
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info(f"Write coalescer stopped: {self.stats()}")
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Queue a write operation and wait until it is committed durably; returns the op's result"""
+        future = asyncio.get_running_loop().create_future()
+        item = (op, future, time.monotonic())
+
+        if self.is_running:
+            self._queue.put_nowait(item)
+        else:
+            await self._flush([item])
+
+        return await future
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Queue a single statement; returns the affected row count once committed"""
+        async def op(db: aiosqlite.Connection) -> int:
+            cursor = await db.execute(sql, params)
+            return cursor.rowcount
+
+        return await self.submit(op)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[WriteOp, asyncio.Future, float]]):
+        """Run every op of the batch in one transaction, isolating failures with savepoints"""
+        results: List[Tuple[bool, Any]] = []
+
+        try:
+            async with self.pool.writer() as db:
+                await db.execute("BEGIN IMMEDIATE")
+                for op, _, _ in batch:
+                    await db.execute("SAVEPOINT coalesced_write")
+                    try:
+                        results.append((True, await op(db)))
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO coalesced_write")
+                        results.append((False, e))
+                    finally:
+                        await db.execute("RELEASE coalesced_write")
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error committing batch of {len(batch)} writes: {e}", exc_info=True)
+            results = [(False, e)] * len(batch)
+
+        now = time.monotonic()
+        self.batches_total += 1
+        for (_, future, queued_at), (ok, value) in zip(batch, results):
+            self.writes_total += 1
+            self._latencies.append(now - queued_at)
+            if not ok:
+                self.writes_failed += 1
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput and flush latency (milliseconds) over the recent sample window"""
+        latencies = sorted(self._latencies)
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "writes": self.writes_total,
+            "failed": self.writes_failed,
+            "batches": self.batches_total,
+            "avg_batch": self.writes_total / self.batches_total if self.batches_total else 0.0,
+            "writes_per_sec": self.writes_total / uptime if uptime else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+write_queue = WriteCoalescer(sqlite_pool, settings.sqlite_write_batch_window_ms, settings.sqlite_write_batch_size)
@@ -4,9 +4,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from database.sqlite_manager import SQLiteManager
 from database.supabase_manager import SupabaseManager
+from middleware.context import UserContext
 from keyboards.inline import admin_menu_keyboard, main_menu_keyboard, back_to_menu_keyboard
 from utils.states import AdminStates
-import asyncio
+from utils.broadcast import broadcast_engine
+from utils.segments import BroadcastSegment, BROADCAST_LANGUAGES
+from typing import Any, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,9 +17,9 @@ router = Router()
 
 
 @router.message(Command("admin"))
-async def admin_command(message: Message, state: FSMContext):
+async def admin_command(message: Message, state: FSMContext, user_ctx: UserContext):
     """Admin command handler"""
-    if not await SQLiteManager.is_admin(message.from_user.id):
+    if not user_ctx.is_admin:
         await message.answer("❌ You don't have admin privileges.")
         return
 
@@ -30,9 +33,9 @@ async def admin_command(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_panel")
-async def admin_panel_callback(callback: CallbackQuery, state: FSMContext):
+async def admin_panel_callback(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Admin panel access via callback"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ You don't have admin privileges.", show_alert=True)
         return
 
@@ -48,9 +51,9 @@ async def admin_panel_callback(callback: CallbackQuery, state: FSMContext):
 
 # OLYMPIAD MANAGEMENT
 @router.callback_query(F.data == "admin_create_olympiad")
-async def start_create_olympiad(callback: CallbackQuery, state: FSMContext):
+async def start_create_olympiad(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Start creating new olympiad"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ Admin access required", show_alert=True)
         return
 
@@ -230,10 +233,21 @@ async def process_olympiad_price(message: Message, state: FSMContext):
     await state.set_state(AdminStates.admin_menu)
 
 
+async def _get_listed_olympiad(state: FSMContext, number: int) -> Optional[Dict[str, Any]]:
+    """Olympiad the admin picked by its number in the list shown earlier, None if the number is invalid"""
+    olympiad_ids = await state.get_value('olympiad_ids', [])
+    if number < 1 or number > len(olympiad_ids):
+        return None
+
+    # Only ids are kept in FSM data; the catalog serves SQLite olympiads from memory
+    olympiad_id = olympiad_ids[number - 1]
+    return await SQLiteManager.get_olympiad_by_id(olympiad_id) or await SupabaseManager.get_olympiad_by_id(olympiad_id)
+
+
 @router.callback_query(F.data == "admin_delete_olympiad")
-async def start_delete_olympiad(callback: CallbackQuery, state: FSMContext):
+async def start_delete_olympiad(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Start delete olympiad process"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ Admin access required", show_alert=True)
         return
 
@@ -250,8 +264,10 @@ async def start_delete_olympiad(callback: CallbackQuery, state: FSMContext):
     text = "🗑️ **Delete Olympiad**\n\n"
     text += "Available olympiads:\n\n"
 
+    stats = await SupabaseManager.get_olympiads_stats([olympiad['id'] for olympiad in olympiads])
+
     for i, olympiad in enumerate(olympiads, 1):
-        registrations = await SupabaseManager.get_olympiad_registrations_count(olympiad['id'])
+        registrations = stats.get(olympiad['id'], {}).get('registrations', 0)
         text += f"{i}. {olympiad['title']} ({olympiad['subject']})\n"
         text += f"   📅 {olympiad['date']} | 👥 {registrations} registrations\n\n"
 
@@ -264,7 +280,7 @@ async def start_delete_olympiad(callback: CallbackQuery, state: FSMContext):
         parse_mode="Markdown"
     )
 
-    await state.update_data(olympiads=olympiads)
+    await state.update_data(olympiad_ids=[olympiad['id'] for olympiad in olympiads])
     await state.set_state(AdminStates.delete_olympiad)
     await callback.answer()
 
@@ -273,17 +289,12 @@ async def start_delete_olympiad(callback: CallbackQuery, state: FSMContext):
 async def process_delete_olympiad(message: Message, state: FSMContext):
     """Process olympiad deletion"""
     try:
-        olympiad_index = int(message.text.strip()) - 1
+        olympiad = await _get_listed_olympiad(state, int(message.text.strip()))
 
-        data = await state.get_data()
-        olympiads = data['olympiads']
-
-        if olympiad_index < 0 or olympiad_index >= len(olympiads):
+        if not olympiad:
             await message.answer("❌ Invalid olympiad number.")
             return
 
-        olympiad = olympiads[olympiad_index]
-
         # Delete olympiad from SQLite
         success = await SQLiteManager.delete_olympiad(olympiad['id'])
 
@@ -309,89 +320,121 @@ async def process_delete_olympiad(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_broadcast")
-async def start_broadcast(callback: CallbackQuery, state: FSMContext):
+async def start_broadcast(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Start broadcast message process"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ Admin access required", show_alert=True)
         return
 
+    pruned_count = await SQLiteManager.count_unreachable_users()
+
     await callback.message.edit_text(
         "📢 **Broadcast Message**\n\n"
-        "Please send the message you want to broadcast to all users.\n\n"
-        "You can send text, photos, videos, or any other content.",
-        reply_markup=back_to_menu_keyboard()
+        "Who should receive it? Send `all` or a filter, e.g.:\n"
+        "`lang=ru,uz points>=10 points<=100 since=2025-01-01 until=2025-06-30 referrals>=3`\n\n"
+        "Add `variants` to send a separate message for each language.\n\n"
+        f"🚫 Pruned recipients (blocked/deleted): {pruned_count}",
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="Markdown"
     )
-    await state.set_state(AdminStates.broadcast_message)
+    await state.set_state(AdminStates.broadcast_segment)
     await callback.answer()
 
 
-@router.message(AdminStates.broadcast_message)
-async def process_broadcast(message: Message, state: FSMContext):
-    """Process and send broadcast message"""
-    users = await SQLiteManager.get_all_users()
+@router.message(AdminStates.broadcast_segment)
+async def process_broadcast_segment(message: Message, state: FSMContext):
+    """Parse the broadcast audience filter"""
+    text = (message.text or "").strip()
+    try:
+        segment = BroadcastSegment.parse(text)
+    except ValueError as e:
+        await message.answer(f"❌ Invalid filter: {e}\n\nSend `all` or a valid filter.", parse_mode="Markdown")
+        return
 
-    if not users:
-        await message.answer("❌ No users found to broadcast to.")
+    use_variants = 'variants' in text.lower().split()
+    if use_variants and not segment.languages:
+        segment.languages = list(BROADCAST_LANGUAGES)
+
+    recipients_count = await SQLiteManager.count_broadcast_recipients(segment)
+    if not recipients_count:
+        await message.answer("❌ No users match this filter. Send another filter or `all`.", parse_mode="Markdown")
         return
 
-    await message.answer(f"📤 Broadcasting message to {len(users)} users...")
+    await state.update_data(
+        broadcast_segment=segment.to_dict(),
+        broadcast_languages=segment.languages if use_variants else [],
+        broadcast_variants={}
+    )
+
+    summary = f"🎯 Audience: {segment.describe()}\n👥 Recipients: {recipients_count}\n\n"
+    if use_variants:
+        await message.answer(
+            summary + f"Send the message for language **{segment.languages[0]}** (or `skip`).",
+            parse_mode="Markdown"
+        )
+        await state.set_state(AdminStates.broadcast_variant)
+    else:
+        await message.answer(
+            summary + "Please send the message you want to broadcast.\n\n"
+                      "You can send text, photos, videos, or any other content."
+        )
+        await state.set_state(AdminStates.broadcast_message)
 
-    success_count = 0
-    failed_count = 0
 
-    for user_id in users:
-        try:
-            if message.text:
-                await message.bot.send_message(user_id, message.text)
-            elif message.photo:
-                await message.bot.send_photo(
-                    user_id,
-                    message.photo[-1].file_id,
-                    caption=message.caption
-                )
-            elif message.video:
-                await message.bot.send_video(
-                    user_id,
-                    message.video.file_id,
-                    caption=message.caption
-                )
-            elif message.document:
-                await message.bot.send_document(
-                    user_id,
-                    message.document.file_id,
-                    caption=message.caption
-                )
-            elif message.audio:
-                await message.bot.send_audio(
-                    user_id,
-                    message.audio.file_id,
-                    caption=message.caption
-                )
-            elif message.voice:
-                await message.bot.send_voice(
-                    user_id,
-                    message.voice.file_id
-                )
-            elif message.sticker:
-                await message.bot.send_sticker(
-                    user_id,
-                    message.sticker.file_id
-                )
-
-            success_count += 1
-
-            # Small delay to avoid rate limiting
-            await asyncio.sleep(0.1)
+@router.message(AdminStates.broadcast_variant)
+async def process_broadcast_variant(message: Message, state: FSMContext):
+    """Collect one per-language broadcast message, start the job after the last language"""
+    data = await state.get_data()
+    languages = data['broadcast_languages']
+    variants = data['broadcast_variants']
+    language = languages[len(variants)]
 
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Failed to send broadcast to {user_id}: {e}")
+    if message.text and message.text.strip().lower() == 'skip':
+        variants[language] = None
+    else:
+        variants[language] = message.message_id
+    await state.update_data(broadcast_variants=variants)
+
+    if len(variants) < len(languages):
+        await message.answer(
+            f"Send the message for language **{languages[len(variants)]}** (or `skip`).",
+            parse_mode="Markdown"
+        )
+        return
+
+    variants = {lang: message_id for lang, message_id in variants.items() if message_id is not None}
+    if not variants:
+        await message.answer("❌ All languages were skipped, broadcast cancelled.", reply_markup=admin_menu_keyboard())
+        await state.set_state(AdminStates.admin_menu)
+        return
+
+    await _start_broadcast(message, state, next(iter(variants.values())), variants)
+
+
+@router.message(AdminStates.broadcast_message)
+async def process_broadcast(message: Message, state: FSMContext):
+    """Start a background broadcast of the message"""
+    await _start_broadcast(message, state, message.message_id)
+
+
+async def _start_broadcast(message: Message, state: FSMContext, message_id: int, variants: Optional[Dict[str, int]] = None):
+    data = await state.get_data()
+    segment = BroadcastSegment(**data.get('broadcast_segment', {}))
+
+    job_id = await broadcast_engine.start_job(
+        message.bot,
+        admin_id=message.from_user.id,
+        from_chat_id=message.chat.id,
+        message_id=message_id,
+        segment=segment,
+        variants=variants
+    )
+    job = await SQLiteManager.get_broadcast_job(job_id)
 
     await message.answer(
-        f"📊 **Broadcast Complete**\n\n"
-        f"✅ Successfully sent: {success_count}\n"
-        f"❌ Failed to send: {failed_count}\n"
-        f"📱 Total users: {len(users)}",
+        f"📤 **Broadcast #{job_id} started**\n\n"
+        f"Sending to {job['total']} users ({segment.describe()}) in the background.\n"
+        f"You will get a report when it is finished.",
         reply_markup=admin_menu_keyboard(),
         parse_mode="Markdown"
     )
@@ -400,9 +443,9 @@ async def process_broadcast(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_set_price")
-async def start_set_price(callback: CallbackQuery, state: FSMContext):
+async def start_set_price(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Start set olympiad price process"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ Admin access required", show_alert=True)
         return
 
@@ -419,8 +462,10 @@ async def start_set_price(callback: CallbackQuery, state: FSMContext):
     text = "💰 **Set Olympiad Price**\n\n"
     text += "Available olympiads:\n\n"
 
+    stats = await SupabaseManager.get_olympiads_stats([olympiad['id'] for olympiad in olympiads])
+
     for i, olympiad in enumerate(olympiads, 1):
-        current_price = await SupabaseManager.get_olympiad_price(olympiad['id'])
+        current_price = stats.get(olympiad['id'], {}).get('price', 0)
         text += f"{i}. {olympiad['title']} - Current price: {current_price} points\n"
 
     text += "\nPlease send the olympiad number and new price in format:\n"
@@ -432,7 +477,7 @@ async def start_set_price(callback: CallbackQuery, state: FSMContext):
         parse_mode="Markdown"
     )
 
-    await state.update_data(olympiads=olympiads)
+    await state.update_data(olympiad_ids=[olympiad['id'] for olympiad in olympiads])
     await state.set_state(AdminStates.set_olympiad_price)
     await callback.answer()
 
@@ -446,13 +491,12 @@ async def process_set_price(message: Message, state: FSMContext):
             await message.answer("❌ Invalid format. Use: `olympiad_number new_price`", parse_mode="Markdown")
             return
 
-        olympiad_index = int(parts[0]) - 1
+        olympiad_number = int(parts[0])
         new_price = int(parts[1])
 
-        data = await state.get_data()
-        olympiads = data['olympiads']
+        olympiad = await _get_listed_olympiad(state, olympiad_number)
 
-        if olympiad_index < 0 or olympiad_index >= len(olympiads):
+        if not olympiad:
             await message.answer("❌ Invalid olympiad number.")
             return
 
@@ -460,12 +504,10 @@ async def process_set_price(message: Message, state: FSMContext):
             await message.answer("❌ Price cannot be negative.")
             return
 
-        olympiad = olympiads[olympiad_index]
-
         # Update price in Supabase
         try:
             supabase = SupabaseManager.get_supabase_client()
-            supabase.table("olympiads").update({"price": new_price}).eq("id", olympiad['id']).execute()
+            await supabase.table("olympiads").update({"price": new_price}).eq("id", olympiad['id']).execute()
 
             await message.answer(
                 f"✅ **Price Updated**\n\n"
@@ -486,9 +528,9 @@ async def process_set_price(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_set_limit")
-async def start_set_limit(callback: CallbackQuery, state: FSMContext):
+async def start_set_limit(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Start set registration limit process"""
-    if not await SQLiteManager.is_admin(callback.from_user.id):
+    if not user_ctx.is_admin:
         await callback.answer("❌ Admin access required", show_alert=True)
         return
 
@@ -505,9 +547,12 @@ async def start_set_limit(callback: CallbackQuery, state: FSMContext):
     text = "🔢 **Set Registration Limit**\n\n"
     text += "Available olympiads:\n\n"
 
+    stats = await SupabaseManager.get_olympiads_stats([olympiad['id'] for olympiad in olympiads])
+
     for i, olympiad in enumerate(olympiads, 1):
-        current_limit = await SupabaseManager.get_olympiad_limit(olympiad['id'])
-        current_registrations = await SupabaseManager.get_olympiad_registrations_count(olympiad['id'])
+        olympiad_stats = stats.get(olympiad['id'], {})
+        current_limit = olympiad_stats.get('registration_limit')
+        current_registrations = olympiad_stats.get('registrations', 0)
         text += f"{i}. {olympiad['title']}\n"
         text += f"   Current limit: {current_limit or 'No limit'}\n"
         text += f"   Current registrations: {current_registrations}\n\n"
@@ -522,7 +567,7 @@ async def start_set_limit(callback: CallbackQuery, state: FSMContext):
         parse_mode="Markdown"
     )
 
-    await state.update_data(olympiads=olympiads)
+    await state.update_data(olympiad_ids=[olympiad['id'] for olympiad in olympiads])
     await state.set_state(AdminStates.set_olympiad_limit)
     await callback.answer()
 
@@ -536,13 +581,12 @@ async def process_set_limit(message: Message, state: FSMContext):
             await message.answer("❌ Invalid format. Use: `olympiad_number new_limit`", parse_mode="Markdown")
             return
 
-        olympiad_index = int(parts[0]) - 1
+        olympiad_number = int(parts[0])
         new_limit = int(parts[1])
 
-        data = await state.get_data()
-        olympiads = data['olympiads']
+        olympiad = await _get_listed_olympiad(state, olympiad_number)
 
-        if olympiad_index < 0 or olympiad_index >= len(olympiads):
+        if not olympiad:
             await message.answer("❌ Invalid olympiad number.")
             return
 
@@ -550,13 +594,12 @@ async def process_set_limit(message: Message, state: FSMContext):
             await message.answer("❌ Limit cannot be negative.")
             return
 
-        olympiad = olympiads[olympiad_index]
         limit_value = new_limit if new_limit > 0 else None
 
         # Update limit in Supabase
         try:
             supabase = SupabaseManager.get_supabase_client()
-            supabase.table("olympiads").update({"registration_limit": limit_value}).eq("id", olympiad['id']).execute()
+            await supabase.table("olympiads").update({"registration_limit": limit_value}).eq("id", olympiad['id']).execute()
 
             limit_text = f"{new_limit} registrations" if new_limit > 0 else "No limit"
             await message.answer(
@@ -574,4 +617,55 @@ async def process_set_limit(message: Message, state: FSMContext):
     except ValueError:
         await message.answer("❌ Please enter valid numbers.")
 
-    await state.set_state(AdminStates.admin_menu)
\ No newline at end of file
+    await state.set_state(AdminStates.admin_menu)
+
+
+@router.callback_query(F.data == "admin_referral_analytics")
+async def start_referral_analytics(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
+    """Start referral tree analytics lookup"""
+    if not user_ctx.is_admin:
+        await callback.answer("❌ Admin access required", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        "🌳 **Referral Analytics**\n\n"
+        "Please send the Telegram ID of the user to analyze.",
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminStates.referral_analytics)
+    await callback.answer()
+
+
+@router.message(AdminStates.referral_analytics)
+async def process_referral_analytics(message: Message, state: FSMContext):
+    """Show a user's direct and indirect referral network"""
+    try:
+        telegram_id = int(message.text.strip())
+    except (ValueError, AttributeError):
+        await message.answer("❌ Please enter a valid Telegram ID.")
+        return
+
+    user = await SQLiteManager.get_user(telegram_id)
+    if not user:
+        await message.answer("❌ User not found. Send another Telegram ID.")
+        return
+
+    stats = await SQLiteManager.get_referral_tree_stats(telegram_id)
+    name = user['first_name'] or user['username'] or "Unknown"
+
+    text = f"🌳 Referral Analytics: {name} ({telegram_id})\n\n"
+    text += f"👥 Direct referrals: {stats['direct']}\n"
+    text += f"🌐 Whole network: {stats['total']}\n"
+    text += f"⬆️ Upline depth: {stats['depth']}\n"
+
+    if stats['levels']:
+        text += "\nBy level:\n"
+        for depth, count in list(stats['levels'].items())[:10]:
+            text += f"   Level {depth}: {count}\n"
+
+    if stats['upline']:
+        text += "\nReferred through: " + " ← ".join(str(ancestor) for ancestor in stats['upline'][:10]) + "\n"
+
+    await message.answer(text, reply_markup=admin_menu_keyboard())
+    await state.set_state(AdminStates.admin_menu)
@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.sqlite_manager import SQLiteManager
+from middleware.context import UserContext
 from keyboards.inline import main_menu_keyboard
 from utils.helpers import check_user_in_channel
 from utils.states import UserStates
@@ -14,23 +15,24 @@ router = Router()
 
 
 @router.callback_query(F.data == "check_joined")
-async def check_channel_membership(callback: CallbackQuery, state: FSMContext):
+async def check_channel_membership(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Check if user has joined the channel"""
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
 
     if await check_user_in_channel(callback.bot, user_id):
         # User has joined the channel
         await SQLiteManager.update_channel_status(user_id, True)
 
         # Check if this user was referred by someone
-        user = await SQLiteManager.get_user(user_id)
+        user = user_ctx.user
         if user and user['referred_by']:
             # Give points to the referrer
-            await SQLiteManager.add_referral_points(user['referred_by'], settings.referral_points)
-            logger.info(f"Gave {settings.referral_points} points to user {user['referred_by']} for referring {user_id}")
+            # Repeated check_joined clicks hit the same ledger key and credit nothing
+            if await SQLiteManager.add_referral_points(user['referred_by'], settings.referral_points, user_id):
+                logger.info(f"Gave {settings.referral_points} points to user {user['referred_by']} for referring {user_id}")
 
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         success_text = LanguageManager.get_text('welcome_back', user_language, first_name='')
         await callback.message.edit_text(
             "🎉 " + success_text,
@@ -3,9 +3,11 @@ from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.supabase_manager import SupabaseManager
 from database.sqlite_manager import SQLiteManager
+from middleware.context import UserContext
 from keyboards.inline import olympiads_keyboard, olympiad_detail_keyboard, main_menu_keyboard
 from utils.states import UserStates
 from utils.language_manager import LanguageManager
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,14 +15,30 @@ router = Router()
 
 
 @router.callback_query(F.data == "view_olympiads")
-async def show_olympiads(callback: CallbackQuery, state: FSMContext):
-    """Show list of all olympiads from SQLite"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
-    olympiads = await SQLiteManager.get_all_olympiads()
-
-    if not olympiads:
-        is_admin = await SQLiteManager.is_admin(user_id)
+async def show_olympiads(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
+    """Show first page of olympiads"""
+    await _show_olympiads_page(callback, state, user_ctx)
+
+
+@router.callback_query(F.data.startswith("opg_"))
+async def page_olympiads(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
+    """Show previous/next page of olympiads"""
+    direction, _, cursor_id = callback.data[len("opg_"):].partition("|")
+    await _show_olympiads_page(callback, state, user_ctx, cursor_id or None, backwards=direction == "p")
+
+
+async def _show_olympiads_page(
+        callback: CallbackQuery,
+        state: FSMContext,
+        user_ctx: UserContext,
+        cursor_id: Optional[str] = None,
+        backwards: bool = False
+):
+    user_language = user_ctx.language
+    page = await SQLiteManager.get_olympiads_page(cursor_id, backwards)
+
+    if not page['olympiads']:
+        is_admin = user_ctx.is_admin
         no_olympiads_text = LanguageManager.get_text('olympiads.no_olympiads', user_language)
         await callback.message.edit_text(
             no_olympiads_text,
@@ -34,7 +52,12 @@ async def show_olympiads(callback: CallbackQuery, state: FSMContext):
 
     await callback.message.edit_text(
         text,
-        reply_markup=olympiads_keyboard(olympiads, language=user_language),
+        reply_markup=olympiads_keyboard(
+            page['olympiads'],
+            language=user_language,
+            has_prev=page['has_prev'],
+            has_next=page['has_next']
+        ),
         parse_mode="Markdown"
     )
     await state.set_state(UserStates.viewing_olympiads)
@@ -42,10 +65,9 @@ async def show_olympiads(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("olympiad_"))
-async def show_olympiad_details(callback: CallbackQuery, state: FSMContext):
+async def show_olympiad_details(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Show details of selected olympiad"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     olympiad_id = callback.data.split("_")[1]
     olympiad = await SQLiteManager.get_olympiad_by_id(olympiad_id)
 
@@ -56,7 +78,6 @@ async def show_olympiad_details(callback: CallbackQuery, state: FSMContext):
 
     # Get current registrations count from Supabase
     current_registrations = await SupabaseManager.get_olympiad_registrations_count(olympiad_id)
-    user = await SQLiteManager.get_user(user_id)
 
     text = f"🏆 **{olympiad['title']}**\n\n"
     text += f"📚 {LanguageManager.get_text('olympiads.subject', user_language)}: {olympiad['subject']}\n"
@@ -64,7 +85,7 @@ async def show_olympiad_details(callback: CallbackQuery, state: FSMContext):
 
     if olympiad['price'] > 0:
         text += f"💰 {LanguageManager.get_text('olympiads.price', user_language)}: {olympiad['price']} points\n"
-        text += f"💳 Your Points: {user['points']}\n"
+        text += f"💳 Your Points: {user_ctx.points}\n"
     else:
         text += f"💰 {LanguageManager.get_text('olympiads.price', user_language)}: {LanguageManager.get_text('olympiads.free', user_language)}\n"
 
@@ -77,7 +98,7 @@ async def show_olympiad_details(callback: CallbackQuery, state: FSMContext):
 
     await callback.message.edit_text(
         text,
-        reply_markup=olympiad_detail_keyboard(olympiad_id, olympiad['price'], user['points'], language=user_language),
+        reply_markup=olympiad_detail_keyboard(olympiad_id, olympiad['price'], user_ctx.points, language=user_language),
         parse_mode="Markdown"
     )
     await state.set_state(UserStates.olympiad_selected)
@@ -86,11 +107,10 @@ async def show_olympiad_details(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "back_to_menu")
-async def back_to_main_menu(callback: CallbackQuery, state: FSMContext):
+async def back_to_main_menu(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Return to main menu"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
-    is_admin = await SQLiteManager.is_admin(user_id)
+    user_language = user_ctx.language
+    is_admin = user_ctx.is_admin
     await callback.message.edit_text(
         "🏠 Main Menu\n\n" + LanguageManager.get_text('welcome_back', user_language, first_name=''),
         reply_markup=main_menu_keyboard(is_admin, language=user_language),
@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.sqlite_manager import SQLiteManager
+from middleware.context import UserContext
 from keyboards.inline import back_to_menu_keyboard, main_menu_keyboard
 from utils.helpers import create_referral_link
 from utils.language_manager import LanguageManager
@@ -12,22 +13,18 @@ router = Router()
 
 
 @router.callback_query(F.data == "invite_friends")
-async def show_referral_info(callback: CallbackQuery, state: FSMContext):
+async def show_referral_info(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Show referral link and statistics"""
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     bot_info = await callback.bot.get_me()
 
-    # Get user's referral statistics
-    user = await SQLiteManager.get_user(user_id)
-    referrals = await SQLiteManager.get_user_referrals(user_id)
-
     # Generate referral link
     referral_link = create_referral_link(user_id, bot_info.username)
 
     text = LanguageManager.get_text('referral.title', user_language) + "\n\n"
-    text += f"🎯 {LanguageManager.get_text('referral.points', user_language, points=user['points'])}\n"
-    text += f"👥 {LanguageManager.get_text('referral.referrals_count', user_language, count=len(referrals))}\n\n"
+    text += f"🎯 {LanguageManager.get_text('referral.points', user_language, points=user_ctx.points)}\n"
+    text += f"👥 {LanguageManager.get_text('referral.referrals_count', user_language, count=user_ctx.referral_count)}\n\n"
     text += f"🔗 {LanguageManager.get_text('referral.your_link', user_language)}:\n`{referral_link}`\n\n"
     text += LanguageManager.get_text('referral.copy_link', user_language)
 
@@ -40,24 +37,20 @@ async def show_referral_info(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("invite_for_"))
-async def invite_for_olympiad(callback: CallbackQuery, state: FSMContext):
+async def invite_for_olympiad(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Generate referral link specifically for an olympiad"""
     olympiad_id = callback.data.split("_")[2]
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     bot_info = await callback.bot.get_me()
 
-    # Get user's referral statistics
-    user = await SQLiteManager.get_user(user_id)
-    referrals = await SQLiteManager.get_user_referrals(user_id)
-
     # Generate referral link
     referral_link = create_referral_link(user_id, bot_info.username)
 
     text = "👥 " + LanguageManager.get_text('referral.title', user_language) + "\n\n"
     text += f"📊 {LanguageManager.get_text('referral.stats', user_language)}:\n"
-    text += f"• {LanguageManager.get_text('referral.points', user_language, points=user['points'])}\n"
-    text += f"• {LanguageManager.get_text('referral.referrals_count', user_language, count=len(referrals))}\n\n"
+    text += f"• {LanguageManager.get_text('referral.points', user_language, points=user_ctx.points)}\n"
+    text += f"• {LanguageManager.get_text('referral.referrals_count', user_language, count=user_ctx.referral_count)}\n\n"
     text += f"🔗 {LanguageManager.get_text('referral.your_link', user_language)}:\n`{referral_link}`\n\n"
     text += LanguageManager.get_text('referral.copy_link', user_language)
 
@@ -70,35 +63,65 @@ async def invite_for_olympiad(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "my_stats")
-async def show_user_stats(callback: CallbackQuery, state: FSMContext):
+async def show_user_stats(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Show user's referral statistics"""
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
 
-    user = await SQLiteManager.get_user(user_id)
-    referrals = await SQLiteManager.get_user_referrals(user_id)
-
-    # Count successful referrals (those who joined the channel)
-    successful_referrals = [r for r in referrals if r['joined_channel']]
+    user = user_ctx.user
+    successful_count = user_ctx.successful_referral_count
 
     text = LanguageManager.get_text('referral.stats', user_language) + "\n\n"
-    text += f"🎯 {LanguageManager.get_text('referral.points', user_language, points=user['points'])}\n"
-    text += f"👥 {LanguageManager.get_text('referral.referrals_count', user_language, count=len(referrals))}\n"
-    text += f"✅ Successful Referrals: {len(successful_referrals)}\n"
+    text += f"🎯 {LanguageManager.get_text('referral.points', user_language, points=user_ctx.points)}\n"
+    text += f"👥 {LanguageManager.get_text('referral.referrals_count', user_language, count=user_ctx.referral_count)}\n"
+    text += f"✅ Successful Referrals: {successful_count}\n"
     text += f"📅 Member Since: {user['created_at'][:10]}\n\n"
 
-    if successful_referrals:
+    if successful_count:
         text += "🏆 Your Successful Referrals:\n"
-        for ref in successful_referrals[:5]:  # Show first 5
+        preview = await SQLiteManager.get_user_referrals(user_id, limit=5, successful_only=True)
+        for ref in preview:  # Show first 5
             name = ref['first_name'] or ref['username'] or "Unknown"
             text += f"• {name}\n"
 
-        if len(successful_referrals) > 5:
-            text += f"... and {len(successful_referrals) - 5} more!\n"
+        if successful_count > 5:
+            text += f"... and {successful_count - 5} more!\n"
 
     await callback.message.edit_text(
         text,
         reply_markup=back_to_menu_keyboard(language=user_language),
         parse_mode="Markdown"
     )
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
+
+
+@router.callback_query(F.data == "leaderboard")
+async def show_leaderboard(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
+    """Show top referrers and the user's own rank"""
+    user_language = user_ctx.language
+
+    top = await SQLiteManager.get_referral_leaderboard()
+    rank = await SQLiteManager.get_referral_rank(user_ctx.user)
+
+    text = LanguageManager.get_text('leaderboard.title', user_language) + "\n\n"
+    if top:
+        for position, entry in enumerate(top, start=1):
+            name = entry['first_name'] or entry['username'] or "Unknown"
+            text += LanguageManager.get_text(
+                'leaderboard.entry', user_language,
+                rank=position, name=name, count=entry['successful_referral_count'], points=entry['points']
+            ) + "\n"
+    else:
+        text += LanguageManager.get_text('leaderboard.empty', user_language) + "\n"
+
+    text += "\n"
+    if rank:
+        text += LanguageManager.get_text('leaderboard.your_rank', user_language, rank=rank)
+    else:
+        text += LanguageManager.get_text('leaderboard.not_ranked', user_language)
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=back_to_menu_keyboard(language=user_language)
+    )
+    await callback.answer()
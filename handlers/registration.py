@@ -3,14 +3,17 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.supabase_manager import SupabaseManager
 from database.sqlite_manager import SQLiteManager
+from middleware.context import UserContext
 from keyboards.inline import (
     gender_keyboard, yes_no_keyboard, confirmation_keyboard,
     back_to_menu_keyboard, main_menu_keyboard
 )
 from keyboards.reply import cancel_registration_keyboard
+from utils.forms import RegistrationForm
 from utils.states import UserStates
 from utils.language_manager import LanguageManager
 import re
+from typing import Optional, Union
 from aiogram.utils.markdown import hbold, hcode
 import logging
 
@@ -18,11 +21,31 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 
+async def _load_form(
+        event: Union[Message, CallbackQuery],
+        state: FSMContext,
+        user_ctx: UserContext
+) -> Optional[RegistrationForm]:
+    """Registration form of this session; if it is gone, tell the user and reset the flow"""
+    form = await RegistrationForm.load(state)
+    if form is None:
+        error_text = LanguageManager.get_text('errors.invalid_input', user_ctx.language)
+        if isinstance(event, CallbackQuery):
+            await event.answer(error_text, show_alert=True)
+        else:
+            await event.answer(
+                error_text,
+                reply_markup=main_menu_keyboard(user_ctx.is_admin, language=user_ctx.language)
+            )
+        await state.clear()
+    return form
+
+
 @router.callback_query(F.data.startswith("register_"))
-async def start_registration(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def start_registration(callback: CallbackQuery, state: FSMContext, bot: Bot, user_ctx: UserContext):
     """Start the registration process"""
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     olympiad_id = callback.data.split("_")[1]
 
     # Check if olympiad exists in SQLite
@@ -34,6 +57,9 @@ async def start_registration(callback: CallbackQuery, state: FSMContext, bot: Bo
 
     # Check registration limit
     current_registrations = await SupabaseManager.get_olympiad_registrations_count(olympiad_id)
+    if olympiad['registration_limit'] and current_registrations >= olympiad['registration_limit']:
+        # Confirm with an exact count before turning the user away
+        current_registrations = await SupabaseManager.get_olympiad_registrations_count(olympiad_id, fresh=True)
 
     if olympiad['registration_limit'] and current_registrations >= olympiad['registration_limit']:
         closed_text = LanguageManager.get_text('registration.closed', user_language)
@@ -45,8 +71,8 @@ async def start_registration(callback: CallbackQuery, state: FSMContext, bot: Bo
         await callback.answer()
         return
 
-    # Store olympiad info in state
-    await state.update_data(olympiad_id=olympiad_id, olympiad=olympiad)
+    # Start a fresh form, the olympiad itself is looked up again when needed
+    await RegistrationForm(olympiad_id=olympiad_id).save(state)
 
     reg_title = LanguageManager.get_text('registration.title', user_language, olympiad_title=olympiad['title'])
     email_prompt = LanguageManager.get_text('registration.email_prompt', user_language)
@@ -65,14 +91,13 @@ async def start_registration(callback: CallbackQuery, state: FSMContext, bot: Bo
 
 
 @router.message(UserStates.registration_email)
-async def process_email(message: Message, state: FSMContext):
+async def process_email(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process email input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -100,8 +125,13 @@ async def process_email(message: Message, state: FSMContext):
         )
         return
 
-    # Store email and profile info
-    await state.update_data(email=email, profile=profile)
+    # Store email and profile id
+    form = await _load_form(message, state, user_ctx)
+    if form is None:
+        return
+    form.email = email
+    form.profile_id = profile['id']
+    await form.save(state)
 
     birth_year_prompt = LanguageManager.get_text('registration.birth_year_prompt', user_language)
     await message.answer(
@@ -112,14 +142,13 @@ async def process_email(message: Message, state: FSMContext):
 
 
 @router.message(UserStates.registration_birth_year)
-async def process_birth_year(message: Message, state: FSMContext):
+async def process_birth_year(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process birth year input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -137,7 +166,11 @@ async def process_birth_year(message: Message, state: FSMContext):
 
         # Convert year to date format (using January 1st)
         birth_date = f"{year}-01-01"
-        await state.update_data(date_of_birth=birth_date)
+        form = await _load_form(message, state, user_ctx)
+        if form is None:
+            return
+        form.date_of_birth = birth_date
+        await form.save(state)
 
         passport_prompt = LanguageManager.get_text('registration.passport_prompt', user_language)
         await message.answer(
@@ -152,14 +185,13 @@ async def process_birth_year(message: Message, state: FSMContext):
 
 
 @router.message(UserStates.registration_passport)
-async def process_passport(message: Message, state: FSMContext):
+async def process_passport(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process passport ID input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -175,7 +207,11 @@ async def process_passport(message: Message, state: FSMContext):
         await message.answer(invalid_passport, reply_markup=cancel_registration_keyboard())
         return
 
-    await state.update_data(passport_id=passport_id)
+    form = await _load_form(message, state, user_ctx)
+    if form is None:
+        return
+    form.passport_id = passport_id
+    await form.save(state)
 
     gender_prompt = LanguageManager.get_text('registration.gender_prompt', user_language)
     await message.answer(
@@ -186,12 +222,15 @@ async def process_passport(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("gender_"), UserStates.registration_gender)
-async def process_gender(callback: CallbackQuery, state: FSMContext):
+async def process_gender(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Process gender selection"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     gender = callback.data.split("_")[1]
-    await state.update_data(gender=gender)
+    form = await _load_form(callback, state, user_ctx)
+    if form is None:
+        return
+    form.gender = gender
+    await form.save(state)
 
     gender_text = LanguageManager.get_text('registration.gender_selected', user_language, gender=gender.title())
     country_prompt = LanguageManager.get_text('registration.country_prompt', user_language)
@@ -203,14 +242,13 @@ async def process_gender(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(UserStates.registration_country)
-async def process_country(message: Message, state: FSMContext):
+async def process_country(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process country input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -226,7 +264,11 @@ async def process_country(message: Message, state: FSMContext):
         await message.answer(invalid_country, reply_markup=cancel_registration_keyboard())
         return
 
-    await state.update_data(country=country)
+    form = await _load_form(message, state, user_ctx)
+    if form is None:
+        return
+    form.country = country
+    await form.save(state)
 
     city_prompt = LanguageManager.get_text('registration.city_prompt', user_language)
     await message.answer(
@@ -237,14 +279,13 @@ async def process_country(message: Message, state: FSMContext):
 
 
 @router.message(UserStates.registration_city)
-async def process_city(message: Message, state: FSMContext):
+async def process_city(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process city input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -260,7 +301,11 @@ async def process_city(message: Message, state: FSMContext):
         await message.answer(invalid_city, reply_markup=cancel_registration_keyboard())
         return
 
-    await state.update_data(city=city)
+    form = await _load_form(message, state, user_ctx)
+    if form is None:
+        return
+    form.city = city
+    await form.save(state)
 
     heard_about_prompt = LanguageManager.get_text('registration.heard_about_prompt', user_language)
     await message.answer(
@@ -271,14 +316,13 @@ async def process_city(message: Message, state: FSMContext):
 
 
 @router.message(UserStates.registration_heard_about)
-async def process_heard_about(message: Message, state: FSMContext):
+async def process_heard_about(message: Message, state: FSMContext, user_ctx: UserContext):
     """Process 'heard about us' input"""
-    user_id = message.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     # Check if user wants to cancel
     if message.text == "❌ Cancel Registration":
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
         await message.answer(
             cancelled_text,
@@ -294,7 +338,11 @@ async def process_heard_about(message: Message, state: FSMContext):
         await message.answer(invalid_description, reply_markup=cancel_registration_keyboard())
         return
 
-    await state.update_data(heard_about_us=heard_about)
+    form = await _load_form(message, state, user_ctx)
+    if form is None:
+        return
+    form.heard_about_us = heard_about
+    await form.save(state)
 
     participated_prompt = LanguageManager.get_text('registration.participated_prompt', user_language)
     await message.answer(
@@ -305,20 +353,27 @@ async def process_heard_about(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("participated_"), UserStates.registration_participated)
-async def process_participated(callback: CallbackQuery, state: FSMContext):
+async def process_participated(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Process participation history"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     participated = callback.data.split("_")[1] == "yes"
-    await state.update_data(has_participated_before=participated)
+    form = await _load_form(callback, state, user_ctx)
+    if form is None:
+        return
+    olympiad = await SQLiteManager.get_olympiad_by_id(form.olympiad_id)
+    if not olympiad:
+        # The olympiad was deleted meanwhile
+        error_text = LanguageManager.get_text('errors.invalid_input', user_language)
+        await callback.answer(error_text, show_alert=True)
+        await state.clear()
+        return
 
-    # Get all stored data
-    data = await state.get_data()
-    olympiad = data['olympiad']
+    form.has_participated_before = participated
+    await form.save(state)
 
     # Check if user already registered for this olympiad
     existing_registration = await SupabaseManager.check_existing_registration(
-        data['profile']['id'], data['olympiad_id']
+        form.profile_id, form.olympiad_id
     )
 
     if existing_registration:
@@ -339,20 +394,20 @@ async def process_participated(callback: CallbackQuery, state: FSMContext):
         f"🏆 <b>Olympiad:</b> {olympiad['title']}\n"
         f"📚 <b>Subject:</b> {olympiad['subject']}\n"
         f"📅 <b>Date:</b> {olympiad['date']}\n\n"
-        f"📧 <b>Email:</b> {data['email']}\n"
-        f"🎂 <b>Birth Year:</b> {data['date_of_birth'][:4]}\n"
-        f"🆔 <b>Passport:</b> {data['passport_id']}\n"
-        f"👤 <b>Gender:</b> {data['gender'].title()}\n"
-        f"🌍 <b>Country:</b> {data['country']}\n"
-        f"🏙️ <b>City:</b> {data['city']}\n"
-        f"📢 <b>Heard about us:</b> {data['heard_about_us'][:50]}...\n"
+        f"📧 <b>Email:</b> {form.email}\n"
+        f"🎂 <b>Birth Year:</b> {form.date_of_birth[:4]}\n"
+        f"🆔 <b>Passport:</b> {form.passport_id}\n"
+        f"👤 <b>Gender:</b> {form.gender.title()}\n"
+        f"🌍 <b>Country:</b> {form.country}\n"
+        f"🏙️ <b>City:</b> {form.city}\n"
+        f"📢 <b>Heard about us:</b> {form.heard_about_us[:50]}...\n"
         f"🏆 <b>Previous participation:</b> {'Yes' if participated else 'No'}\n\n"
         + LanguageManager.get_text('registration.confirm_prompt', user_language)
     )
 
     await callback.message.edit_text(
         confirmation_text,
-        reply_markup=confirmation_keyboard(data['olympiad_id'], language=user_language),
+        reply_markup=confirmation_keyboard(form.olympiad_id, language=user_language),
         parse_mode="HTML"
     )
 
@@ -361,21 +416,31 @@ async def process_participated(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("confirm_reg_"))
-async def confirm_registration(callback: CallbackQuery, state: FSMContext):
+async def confirm_registration(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Confirm and complete registration"""
     user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
-    data = await state.get_data()
-    olympiad_id = data['olympiad_id']
-    olympiad = data['olympiad']
+    user_language = user_ctx.language
+    form = await _load_form(callback, state, user_ctx)
+    if form is None:
+        return
+    olympiad = await SQLiteManager.get_olympiad_by_id(form.olympiad_id)
+    if not olympiad:
+        # The olympiad was deleted meanwhile
+        error_text = LanguageManager.get_text('errors.invalid_input', user_language)
+        await callback.answer(error_text, show_alert=True)
+        await state.clear()
+        return
+    olympiad_id = form.olympiad_id
 
     # Check if user needs to pay points
     price = await SupabaseManager.get_olympiad_price(olympiad_id)
-    user = await SQLiteManager.get_user(user_id)
 
     if price > 0:
-        if user['points'] < price:
-            insufficient_points = LanguageManager.get_text('registration.insufficient_points', user_language, price=price, current_points=user['points'])
+        idempotency_key = f"olympiad:{olympiad_id}:{user_id}"
+        # A user charged by an earlier attempt that failed later may retry without points left
+        already_paid = await SQLiteManager.points_entry_exists(idempotency_key)
+        if not already_paid and user_ctx.points < price:
+            insufficient_points = LanguageManager.get_text('registration.insufficient_points', user_language, price=price, current_points=user_ctx.points)
             await callback.message.edit_text(
                 insufficient_points,
                 reply_markup=back_to_menu_keyboard(language=user_language),
@@ -387,7 +452,9 @@ async def confirm_registration(callback: CallbackQuery, state: FSMContext):
 
         # Deduct points and remove referrals
         success = await SQLiteManager.deduct_points_and_remove_referrals(
-            user_id, price
+            user_id, price,
+            idempotency_key=idempotency_key,
+            reason='olympiad_registration'
         )
         if not success:
             payment_failed = LanguageManager.get_text('registration.payment_failed', user_language)
@@ -402,14 +469,14 @@ async def confirm_registration(callback: CallbackQuery, state: FSMContext):
     # Register in Supabase
     registration_success = await SupabaseManager.register_for_olympiad(
         olympiad_id=olympiad_id,
-        user_id=data['profile']['id'],
-        passport_id=data['passport_id'],
-        date_of_birth=data['date_of_birth'],
-        gender=data['gender'],
-        country=data['country'],
-        city=data['city'],
-        heard_about_us=data['heard_about_us'],
-        has_participated_before=data['has_participated_before']
+        user_id=form.profile_id,
+        passport_id=form.passport_id,
+        date_of_birth=form.date_of_birth,
+        gender=form.gender,
+        country=form.country,
+        city=form.city,
+        heard_about_us=form.heard_about_us,
+        has_participated_before=form.has_participated_before
     )
 
     if registration_success:
@@ -442,7 +509,7 @@ async def confirm_registration(callback: CallbackQuery, state: FSMContext):
         await callback.message.answer(success_text, parse_mode="HTML")
 
         # 2) Send separate menu message with inline keyboard
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         await callback.message.answer(
             "⬅️ Back to menu",
             reply_markup=main_menu_keyboard(is_admin, language=user_language)
@@ -464,11 +531,10 @@ async def confirm_registration(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "cancel_registration")
-async def cancel_registration(callback: CallbackQuery, state: FSMContext):
+async def cancel_registration(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Cancel registration process"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
-    is_admin = await SQLiteManager.is_admin(user_id)
+    user_language = user_ctx.language
+    is_admin = user_ctx.is_admin
     cancelled_text = LanguageManager.get_text('registration.cancelled', user_language)
     await callback.message.edit_text(
         cancelled_text,
@@ -479,10 +545,9 @@ async def cancel_registration(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "edit_registration")
-async def edit_registration(callback: CallbackQuery, state: FSMContext):
+async def edit_registration(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Allow user to edit registration information"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     edit_text = LanguageManager.get_text('registration.edit', user_language)
     await callback.message.edit_text(
         edit_text,
@@ -493,12 +558,10 @@ async def edit_registration(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "insufficient_points")
-async def insufficient_points_info(callback: CallbackQuery, state: FSMContext):
+async def insufficient_points_info(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Show info about insufficient points"""
-    user_id = callback.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
-    user = await SQLiteManager.get_user(user_id)
-    insufficient_msg = LanguageManager.get_text('registration.insufficient_points_info', user_language, points=user['points'])
+    user_language = user_ctx.language
+    insufficient_msg = LanguageManager.get_text('registration.insufficient_points_info', user_language, points=user_ctx.points)
     await callback.answer(
         insufficient_msg,
         show_alert=True
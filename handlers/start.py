@@ -3,6 +3,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from database.sqlite_manager import SQLiteManager
+from middleware.context import UserContext
 from keyboards.inline import channel_join_keyboard, main_menu_keyboard, language_selection_keyboard
 from utils.helpers import extract_referrer_id, check_user_in_channel
 from utils.states import UserStates
@@ -54,6 +55,10 @@ async def start_handler(message: Message, state: FSMContext):
 
     else:
 
+        # Existing user is reachable again if they had blocked the bot before
+        if existing_user.get('delivery_status', 'active') != 'active':
+            await SQLiteManager.mark_user_reachable(user_id)
+
         # Existing user - handle re-referral first
 
         if referrer_id:
@@ -64,21 +69,24 @@ async def start_handler(message: Message, state: FSMContext):
 
             if not current_referrer or current_referrer != referrer_id:
 
-                # Update referrer
+                # Update referrer (refused for self-referrals and referral cycles)
+
+                if not await SQLiteManager.update_user_referrer(user_id, referrer_id):
 
-                await SQLiteManager.update_user_referrer(user_id, referrer_id)
+                    logger.info(f"Ignored re-referral of {user_id} by {referrer_id}: referral cycle")
 
-                logger.info(f"User {user_id} re-referred by {referrer_id}")
+                else:
 
-                # If user already joined channel, give points immediately
+                    logger.info(f"User {user_id} re-referred by {referrer_id}")
 
-                if existing_user['joined_channel'] or await check_user_in_channel(message.bot, user_id):
-                    await SQLiteManager.add_referral_points(referrer_id, settings.referral_points)
+                    # If user already joined channel, give points immediately
 
-                    logger.info(f"Immediate points given to {referrer_id} for re-referring {user_id}")
+                    if existing_user['joined_channel'] or await check_user_in_channel(message.bot, user_id):
+                        if await SQLiteManager.add_referral_points(referrer_id, settings.referral_points, user_id):
+                            logger.info(f"Immediate points given to {referrer_id} for re-referring {user_id}")
 
         # Existing user - check channel membership
-        user_language = await SQLiteManager.get_user_language(user_id)
+        user_language = existing_user['language'] or 'en'
 
         if await check_user_in_channel(message.bot, user_id):
 
@@ -107,7 +115,7 @@ async def start_handler(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith('lang_'))
-async def language_selection_handler(query: CallbackQuery, state: FSMContext):
+async def language_selection_handler(query: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Handle language selection"""
     user_id = query.from_user.id
     first_name = query.from_user.first_name
@@ -117,16 +125,16 @@ async def language_selection_handler(query: CallbackQuery, state: FSMContext):
     
     # Save language preference
     await SQLiteManager.set_user_language(user_id, language)
+    user_ctx.language = language
     
     # Confirm language selection
     confirmation_text = LanguageManager.get_text('language_selected', language)
     await query.message.edit_text(confirmation_text)
     
     # Check if this is a new user or existing user changing language
-    user = await SQLiteManager.get_user(user_id)
-    if user and user['joined_channel']:
+    if user_ctx.user['joined_channel']:
         # Existing user - show main menu
-        is_admin = await SQLiteManager.is_admin(user_id)
+        is_admin = user_ctx.is_admin
         welcome_text = LanguageManager.get_text('welcome_back', language, first_name=first_name)
         await query.message.answer(
             welcome_text,
@@ -146,10 +154,9 @@ async def language_selection_handler(query: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == 'change_language')
-async def change_language_handler(query: CallbackQuery, state: FSMContext):
+async def change_language_handler(query: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Handle language change from main menu"""
-    user_id = query.from_user.id
-    user_language = await SQLiteManager.get_user_language(user_id)
+    user_language = user_ctx.language
     
     language_text = LanguageManager.get_text('language_selection', user_language)
     await query.message.edit_text(
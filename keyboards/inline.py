@@ -1,8 +1,32 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Optional
 from utils.language_manager import LanguageManager
 
+_cached_keyboards: List[Any] = []
 
+
+def cached_keyboard(maxsize: Optional[int] = None) -> Callable:
+    """
+    Build each (arguments) variant of a keyboard once and hand out the shared markup.
+
+    Returned markups are shared between users and must not be mutated.
+    """
+    def decorator(builder: Callable[..., InlineKeyboardMarkup]):
+        cached = lru_cache(maxsize=maxsize)(builder)
+        _cached_keyboards.append(cached)
+        return cached
+    return decorator
+
+
+@LanguageManager.on_reload
+def clear_keyboard_cache():
+    """Drop prebuilt keyboards so they are rebuilt with the reloaded translations"""
+    for keyboard in _cached_keyboards:
+        keyboard.cache_clear()
+
+
+@cached_keyboard()
 def channel_join_keyboard(channel_link: str, language: str = 'en') -> InlineKeyboardMarkup:
     """Keyboard for joining channel"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -11,12 +35,14 @@ def channel_join_keyboard(channel_link: str, language: str = 'en') -> InlineKeyb
     ])
 
 
+@cached_keyboard()
 def main_menu_keyboard(is_admin: bool = False, language: str = 'en') -> InlineKeyboardMarkup:
     """Main menu keyboard"""
     keyboard = [
         [InlineKeyboardButton(text=LanguageManager.get_button_text('view_olympiads', language), callback_data="view_olympiads")],
         [InlineKeyboardButton(text=LanguageManager.get_button_text('invite_friends', language), callback_data="invite_friends")],
-        [InlineKeyboardButton(text=LanguageManager.get_button_text('my_stats', language), callback_data="my_stats")]
+        [InlineKeyboardButton(text=LanguageManager.get_button_text('my_stats', language), callback_data="my_stats")],
+        [InlineKeyboardButton(text=LanguageManager.get_button_text('leaderboard', language), callback_data="leaderboard")]
     ]
 
     if is_admin:
@@ -27,6 +53,7 @@ def main_menu_keyboard(is_admin: bool = False, language: str = 'en') -> InlineKe
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard()
 def admin_menu_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     """Admin menu keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -35,30 +62,51 @@ def admin_menu_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text=LanguageManager.get_button_text('delete_olympiad', language), callback_data="admin_delete_olympiad")],
         [InlineKeyboardButton(text=LanguageManager.get_button_text('set_price', language), callback_data="admin_set_price")],
         [InlineKeyboardButton(text=LanguageManager.get_button_text('set_limit', language), callback_data="admin_set_limit")],
+        [InlineKeyboardButton(text=LanguageManager.get_button_text('referral_analytics', language), callback_data="admin_referral_analytics")],
         [InlineKeyboardButton(text=LanguageManager.get_button_text('back_to_menu', language), callback_data="back_to_menu")]
     ])
 
 
-def olympiads_keyboard(olympiads: List[Dict[str, Any]], language: str = 'en') -> InlineKeyboardMarkup:
-    """Keyboard showing list of upcoming olympiads"""
+def olympiads_keyboard(
+        olympiads: List[Dict[str, Any]],
+        language: str = 'en',
+        has_prev: bool = False,
+        has_next: bool = False
+) -> InlineKeyboardMarkup:
+    """Keyboard showing one page of upcoming olympiads"""
     keyboard = []
     for olympiad in olympiads:
         button_text = f"🏆 {olympiad['title']} - {olympiad['subject']}"
         callback_data = f"olympiad_{olympiad['id']}"
         keyboard.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
 
+    # Page cursors are the ids of the first/last olympiad shown ("opg_" so it never matches "olympiad_")
+    navigation = []
+    if has_prev and olympiads:
+        navigation.append(InlineKeyboardButton(text=LanguageManager.get_button_text('prev_page', language), callback_data=f"opg_p|{olympiads[0]['id']}"))
+    if has_next and olympiads:
+        navigation.append(InlineKeyboardButton(text=LanguageManager.get_button_text('next_page', language), callback_data=f"opg_n|{olympiads[-1]['id']}"))
+    if navigation:
+        keyboard.append(navigation)
+
     keyboard.append([InlineKeyboardButton(text=LanguageManager.get_button_text('back_to_menu', language), callback_data="back_to_menu")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 def olympiad_detail_keyboard(olympiad_id: str, price: int = 0, user_points: int = 0, language: str = 'en') -> InlineKeyboardMarkup:
     """Keyboard for olympiad details"""
+    # Only affordability changes the markup, so the exact balance stays out of the cache key
+    return _olympiad_detail_keyboard(olympiad_id, price, user_points >= price, language)
+
+
+@cached_keyboard(maxsize=1024)
+def _olympiad_detail_keyboard(olympiad_id: str, price: int, can_afford: bool, language: str) -> InlineKeyboardMarkup:
     keyboard = [
         [InlineKeyboardButton(text=LanguageManager.get_button_text('invite_friend', language), callback_data=f"invite_for_{olympiad_id}")],
     ]
 
     if price > 0:
-        if user_points >= price:
+        if can_afford:
             register_text = LanguageManager.get_text('buttons.register_points', language, price=price)
             keyboard.append([InlineKeyboardButton(text=register_text, callback_data=f"register_{olympiad_id}")])
         else:
@@ -71,6 +119,7 @@ def olympiad_detail_keyboard(olympiad_id: str, price: int = 0, user_points: int
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard()
 def gender_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     """Gender selection keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -79,6 +128,7 @@ def gender_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard()
 def yes_no_keyboard(prefix: str, language: str = 'en') -> InlineKeyboardMarkup:
     """Yes/No keyboard for participation question"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -87,6 +137,7 @@ def yes_no_keyboard(prefix: str, language: str = 'en') -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard(maxsize=1024)
 def confirmation_keyboard(olympiad_id: str, language: str = 'en') -> InlineKeyboardMarkup:
     """Registration confirmation keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -96,6 +147,7 @@ def confirmation_keyboard(olympiad_id: str, language: str = 'en') -> InlineKeybo
     ])
 
 
+@cached_keyboard()
 def back_to_menu_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     """Simple back to menu keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -103,6 +155,7 @@ def back_to_menu_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard()
 def cancel_registration_inline_keyboard(language: str = 'en') -> InlineKeyboardMarkup:
     """Inline keyboard for canceling registration during the process"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -110,6 +163,7 @@ def cancel_registration_inline_keyboard(language: str = 'en') -> InlineKeyboardM
     ])
 
 
+@cached_keyboard()
 def language_selection_keyboard() -> InlineKeyboardMarkup:
     """Keyboard for language selection"""
     return InlineKeyboardMarkup(inline_keyboard=[
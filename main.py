@@ -1,11 +1,16 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from config.settings import settings
-from config.database import init_sqlite_db
+from config.database import init_sqlite_db, init_supabase_client, close_supabase_client
 from config.migrations import run_migrations
+from database.sqlite_pool import sqlite_pool
+from database.write_queue import write_queue
+from database.catalog import olympiad_catalog
+from database.fsm_storage import fsm_storage
+from database.sqlite_manager import user_cache
 from middleware.auth import AuthMiddleware
+from utils.broadcast import broadcast_engine
 
 # Import routers
 from handlers import start, channel, olympiads, referral, registration, admin
@@ -20,6 +25,9 @@ async def main():
     )
     logger = logging.getLogger(__name__)
 
+    # Open SQLite connection pool
+    await sqlite_pool.open()
+
     # Initialize database
     await init_sqlite_db()
     logger.info("Database initialized")
@@ -28,9 +36,21 @@ async def main():
     await run_migrations()
     logger.info("Migrations completed")
 
+    # Start group-commit queue for hot writes
+    await write_queue.start()
+
+    # Warm the olympiad catalog so user-facing reads never hit SQLite
+    await olympiad_catalog.reload()
+
+    # Create shared Supabase client
+    await init_supabase_client()
+    logger.info("Supabase client initialized")
+
     # Initialize bot and dispatcher
     bot = Bot(token=settings.bot_token)
-    storage = MemoryStorage()
+    # SQLite keeps FSM state across restarts; the bounded memory storage caps RSS instead
+    storage = fsm_storage
+    await storage.start()
     dp = Dispatcher(storage=storage)
 
     # Register middleware (only for non-start commands)
@@ -45,6 +65,9 @@ async def main():
     dp.include_router(registration.router)
     dp.include_router(admin.router)
 
+    # Resume broadcasts interrupted by a restart
+    await broadcast_engine.resume_jobs(bot)
+
     logger.info("Bot starting...")
     logger.info(f"Admin IDs: {settings.admin_ids}")
 
@@ -52,7 +75,14 @@ async def main():
         # Start polling
         await dp.start_polling(bot)
     finally:
+        await broadcast_engine.stop()
         await bot.session.close()
+        await close_supabase_client()
+        logger.info(f"FSM storage stats: {storage.stats()}")
+        await storage.close()
+        await write_queue.stop()
+        await sqlite_pool.close()
+        logger.info(f"User cache stats: {user_cache.stats()}")
 
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from database.sqlite_manager import SQLiteManager
-from utils.helpers import check_user_in_channel
+from middleware.context import UserContext
+from utils.helpers import check_user_in_channel, refresh_channel_nonmember
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -31,6 +32,10 @@ class AuthMiddleware(BaseMiddleware):
 
         # Check if user has joined the channel
         if not user['joined_channel']:
+            # "I Joined" should not be refused by a non-member result cached just before the user joined
+            if isinstance(event, CallbackQuery) and event.data == 'check_joined':
+                refresh_channel_nonmember(user_id)
+
             bot = data['bot']
             if not await check_user_in_channel(bot, user_id):
                 if isinstance(event, CallbackQuery):
@@ -41,7 +46,14 @@ class AuthMiddleware(BaseMiddleware):
             else:
                 # User has joined, update database
                 await SQLiteManager.update_channel_status(user_id, True)
+                user['joined_channel'] = 1
+
+        # User is talking to the bot again, so they can receive broadcasts
+        if user.get('delivery_status', 'active') != 'active':
+            await SQLiteManager.mark_user_reachable(user_id)
+            user['delivery_status'] = 'active'
 
-        # Add user data to handler data
+        # Add user data and the request-scoped context to handler data
         data['user'] = user
+        data['user_ctx'] = UserContext.from_user(user, await SQLiteManager.is_admin(user_id))
         return await handler(event, data)
\ No newline at end of file
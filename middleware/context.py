@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import Dict, Any
+
+
+@dataclass
+class UserContext:
+    """Per-update snapshot of the current user, built once by AuthMiddleware"""
+    user: Dict[str, Any]
+    language: str
+    is_admin: bool
+    points: int
+
+    @property
+    def telegram_id(self) -> int:
+        return self.user['telegram_id']
+
+    @property
+    def referral_count(self) -> int:
+        return self.user.get('referral_count') or 0
+
+    @property
+    def successful_referral_count(self) -> int:
+        return self.user.get('successful_referral_count') or 0
+
+    @classmethod
+    def from_user(cls, user: Dict[str, Any], is_admin: bool) -> "UserContext":
+        """Build context from a telegram_users row"""
+        return cls(
+            user=user,
+            language=user.get('language') or 'en',
+            is_admin=is_admin,
+            points=user.get('points') or 0
+        )
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import tempfile
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+# Settings and the SQLite pool are module singletons, so the environment must be ready before they are imported
+_tmp_dir = tempfile.mkdtemp(prefix="bot-olympiad-tests-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp_dir, "test.db")
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("CHANNEL_ID", "@test_channel")
+os.environ.setdefault("CHANNEL_INVITE_LINK", "https://t.me/test_channel")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+
+from config.database import init_sqlite_db  # noqa: E402
+from config.migrations import run_migrations  # noqa: E402
+from config.settings import settings  # noqa: E402
+from database.leaderboard import leaderboard  # noqa: E402
+from database.sqlite_manager import user_cache  # noqa: E402
+from database.sqlite_pool import sqlite_pool  # noqa: E402
+from database.write_queue import write_queue  # noqa: E402
+
+
+@pytest.fixture
+def run_with_db() -> Callable[[Callable[[], Awaitable[Any]]], Any]:
+    """Run a coroutine function against a freshly created and migrated database"""
+    def run(test: Callable[[], Awaitable[Any]]) -> Any:
+        async def main():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(settings.sqlite_db_path + suffix):
+                    os.remove(settings.sqlite_db_path + suffix)
+            user_cache.clear()
+            leaderboard.invalidate()
+
+            await sqlite_pool.open()
+            await init_sqlite_db()
+            await run_migrations()
+            await write_queue.start()
+            try:
+                return await test()
+            finally:
+                await write_queue.stop()
+                await sqlite_pool.close()
+
+        return asyncio.run(main())
+
+    return run
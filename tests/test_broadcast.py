@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+
+from database.sqlite_manager import SQLiteManager
+from utils.broadcast import BroadcastEngine
+
+
+class FakeBot:
+    """Blocks every odd user, delivers to the rest"""
+
+    def __init__(self):
+        self.delivered = []
+        self.reports = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        if chat_id % 2:
+            raise TelegramForbiddenError(method=None, message="Forbidden: bot was blocked by the user")
+        self.delivered.append(chat_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.reports.append(chat_id)
+
+
+async def _seed_job(users: int) -> dict:
+    for telegram_id in range(1, users + 1):
+        await SQLiteManager.create_user(telegram_id, f"user{telegram_id}", "User")
+        await SQLiteManager.update_channel_status(telegram_id, True)
+    job_id = await SQLiteManager.create_broadcast_job(999, 999, 1)
+    return await SQLiteManager.get_broadcast_job(job_id)
+
+
+def test_delivery_errors_do_not_kill_workers(run_with_db, monkeypatch):
+    async def test():
+        job = await _seed_job(20)
+
+        async def broken_prune(telegram_id, status):
+            raise RuntimeError("database is locked")
+
+        monkeypatch.setattr(SQLiteManager, "mark_user_unreachable", broken_prune)
+        bot = FakeBot()
+        await asyncio.wait_for(BroadcastEngine(1000, 2, 0)._run_job(bot, job), timeout=10)
+
+        job = await SQLiteManager.get_broadcast_job(job['id'])
+        assert job['status'] == 'completed'
+        assert (job['sent'], job['failed']) == (10, 10)
+        assert bot.reports == [999]
+
+    run_with_db(test)
+
+
+def test_producer_stops_when_every_worker_died(run_with_db, monkeypatch):
+    async def test():
+        job = await _seed_job(20)
+
+        async def broken_finish(job_id, telegram_id, sent, error=None):
+            raise RuntimeError("disk I/O error")
+
+        monkeypatch.setattr(SQLiteManager, "finish_broadcast_delivery", broken_finish)
+        with pytest.raises(RuntimeError, match="disk I/O error"):
+            await asyncio.wait_for(BroadcastEngine(1000, 2, 0)._run_job(FakeBot(), job), timeout=10)
+
+        job = await SQLiteManager.get_broadcast_job(job['id'])
+        assert job['status'] == 'running'  # Resumed on the next start
+
+    run_with_db(test)
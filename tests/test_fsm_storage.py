@@ -0,0 +1,50 @@
+import json
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from database.fsm_storage import SQLiteStorage
+from database.sqlite_pool import sqlite_pool
+from database.write_queue import write_queue
+from utils.forms import RegistrationForm
+from utils.states import UserStates
+
+KEY = StorageKey(bot_id=1, chat_id=7, user_id=7)
+
+
+def _storage() -> SQLiteStorage:
+    return SQLiteStorage(sqlite_pool, write_queue, 10, 3600, 600, 300)
+
+
+def test_registration_form_survives_restart_as_json(run_with_db):
+    async def test():
+        storage = _storage()
+        state = FSMContext(storage, KEY)
+        await state.set_state(UserStates.registration_city)
+        await RegistrationForm(olympiad_id="o1", profile_id="p1", email="a@b.co", has_participated_before=False).save(state)
+        await storage.close()
+
+        async with sqlite_pool.reader() as db:
+            cursor = await db.execute("SELECT typeof(data), data FROM fsm_storage")
+            rows = await cursor.fetchall()
+        assert [row[0] for row in rows] == ["text"]
+        assert json.loads(rows[0][1]) == {
+            "registration": {"olympiad_id": "o1", "profile_id": "p1", "email": "a@b.co", "has_participated_before": False}
+        }
+
+        restarted = FSMContext(_storage(), KEY)
+        assert await restarted.get_state() == UserStates.registration_city.state
+        assert await RegistrationForm.load(restarted) == RegistrationForm(
+            olympiad_id="o1", profile_id="p1", email="a@b.co", has_participated_before=False
+        )
+
+    run_with_db(test)
+
+
+def test_form_is_missing_without_registration(run_with_db):
+    async def test():
+        state = FSMContext(_storage(), KEY)
+        await state.update_data(olympiad_id="o1", email="a@b.co")  # flat keys of the old flow
+        assert await RegistrationForm.load(state) is None
+
+    run_with_db(test)
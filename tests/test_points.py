@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from config.settings import settings
+from database.sqlite_manager import SQLiteManager
+from database.sqlite_pool import sqlite_pool
+
+
+async def _seed_referrer(referrer_id: int, referrals: int):
+    """Referrer with `referrals` successful referrals, each credited through the ledger"""
+    await SQLiteManager.create_user(referrer_id, "referrer", "Referrer")
+    for referee_id in range(referrer_id + 1, referrer_id + 1 + referrals):
+        await SQLiteManager.create_user(referee_id, f"user{referee_id}", "User", referred_by=referrer_id)
+        await SQLiteManager.update_channel_status(referee_id, True)
+        assert await SQLiteManager.add_referral_points(referrer_id, settings.referral_points, referee_id)
+
+
+async def _ledger_sum(telegram_id: int) -> int:
+    async with sqlite_pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT COALESCE(SUM(delta), 0) FROM points_ledger WHERE telegram_id = ?",
+            (telegram_id,)
+        )
+        return (await cursor.fetchone())[0]
+
+
+@pytest.mark.parametrize("attempts, price", [(10, 30), (50, 20), (25, 100)])
+def test_concurrent_deductions_never_double_spend(run_with_db, attempts, price):
+    async def test():
+        await _seed_referrer(1, 10)
+        balance = 10 * settings.referral_points
+
+        results = await asyncio.gather(*(
+            SQLiteManager.deduct_points_and_remove_referrals(1, price, idempotency_key=f"test:{attempt}")
+            for attempt in range(attempts)
+        ))
+
+        user = await SQLiteManager.get_user(1)
+        assert sum(results) == balance // price
+        assert user['points'] == balance - sum(results) * price
+        assert user['points'] >= 0
+        assert await _ledger_sum(1) == user['points']
+        assert user['successful_referral_count'] == len(await SQLiteManager.get_user_referrals(1, successful_only=True))
+
+    run_with_db(test)
+
+
+def test_replayed_idempotency_key_charges_nothing(run_with_db):
+    async def test():
+        await _seed_referrer(1, 10)
+
+        assert await SQLiteManager.deduct_points_and_remove_referrals(1, 30, idempotency_key="test:replay")
+        replays = await asyncio.gather(*(
+            SQLiteManager.deduct_points_and_remove_referrals(1, 30, idempotency_key="test:replay")
+            for _ in range(5)
+        ))
+
+        user = await SQLiteManager.get_user(1)
+        assert all(replays)
+        assert user['points'] == 70
+        assert await _ledger_sum(1) == 70
+
+    run_with_db(test)
+
+
+def test_crediting_unknown_user_leaves_key_usable(run_with_db):
+    async def test():
+        assert not await SQLiteManager.add_referral_points(1, settings.referral_points, 2)
+        assert await _ledger_sum(1) == 0
+
+        await SQLiteManager.create_user(1, "referrer", "Referrer")
+        assert await SQLiteManager.add_referral_points(1, settings.referral_points, 2)
+        assert not await SQLiteManager.add_referral_points(1, settings.referral_points, 2)
+        assert (await SQLiteManager.get_user(1))['points'] == settings.referral_points
+
+    run_with_db(test)
+
+
+def test_paid_key_is_visible_before_retrying(run_with_db):
+    async def test():
+        await _seed_referrer(1, 3)
+        key = "olympiad:test:1"
+
+        assert not await SQLiteManager.points_entry_exists(key)
+        assert await SQLiteManager.deduct_points_and_remove_referrals(1, 30, idempotency_key=key)
+        assert (await SQLiteManager.get_user(1))['points'] == 0
+
+        # The retry of a charged registration is let through and charges nothing
+        assert await SQLiteManager.points_entry_exists(key)
+        assert await SQLiteManager.deduct_points_and_remove_referrals(1, 30, idempotency_key=key)
+        assert (await SQLiteManager.get_user(1))['points'] == 0
+
+    run_with_db(test)
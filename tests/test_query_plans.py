@@ -0,0 +1,86 @@
+import sqlite3
+from typing import List
+
+from config.settings import settings
+from database.sqlite_manager import SQLiteManager
+from database.sqlite_pool import sqlite_pool
+from utils.segments import BroadcastSegment
+
+
+async def _seed_referrals(referrer_id: int, count: int):
+    await SQLiteManager.create_user(referrer_id, "referrer", "Referrer")
+    for referee_id in range(referrer_id + 1, referrer_id + 1 + count):
+        await SQLiteManager.create_user(referee_id, f"user{referee_id}", "User", referred_by=referrer_id)
+        await SQLiteManager.update_channel_status(referee_id, True)
+        await SQLiteManager.add_referral_points(referrer_id, settings.referral_points, referee_id)
+
+
+async def _traced(statements: List[str]):
+    """Record the expanded SQL every pooled connection runs"""
+    for db in [sqlite_pool._writer, *sqlite_pool._readers]:
+        await db.set_trace_callback(statements.append)
+
+
+def _plan(sql: str) -> str:
+    db = sqlite3.connect(settings.sqlite_db_path)
+    try:
+        return "\n".join(row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}"))
+    finally:
+        db.close()
+
+
+def _plans_of(statements: List[str], marker: str) -> List[str]:
+    plans = [_plan(sql) for sql in statements if marker in sql]
+    assert plans, f"no statement containing {marker!r} was run"
+    return plans
+
+
+def test_get_user_referrals_uses_covering_index(run_with_db):
+    async def test():
+        await _seed_referrals(1, 3)
+        statements: List[str] = []
+        await _traced(statements)
+
+        await SQLiteManager.get_user_referrals(1)
+        await SQLiteManager.get_user_referrals(1, limit=2, successful_only=True)
+
+        for plan in _plans_of(statements, "WHERE referred_by ="):
+            assert "SEARCH telegram_users USING COVERING INDEX idx_telegram_users_referred_by" in plan
+
+    run_with_db(test)
+
+
+def test_broadcast_recipient_pages_use_covering_indexes(run_with_db):
+    async def test():
+        await _seed_referrals(1, 3)
+        statements: List[str] = []
+        await _traced(statements)
+
+        async for _ in SQLiteManager.iter_pending_broadcast_recipients(1, page_size=2):
+            pass
+        plans = _plans_of(statements, "u.telegram_id > ")
+        for plan in plans:
+            assert "SEARCH u USING COVERING INDEX idx_telegram_users_recipients " in plan
+
+        statements.clear()
+        segment = BroadcastSegment(languages=["en", "ru"])
+        async for _ in SQLiteManager.iter_pending_broadcast_recipients(1, segment, page_size=2):
+            pass
+        for plan in _plans_of(statements, "u.telegram_id > "):
+            assert "SEARCH u USING COVERING INDEX idx_telegram_users_recipients_language " in plan
+
+    run_with_db(test)
+
+
+def test_deduct_referral_sampling_uses_covering_index(run_with_db):
+    async def test():
+        await _seed_referrals(1, 3)
+        statements: List[str] = []
+        await _traced(statements)
+
+        assert await SQLiteManager.deduct_points_and_remove_referrals(1, settings.referral_points)
+
+        for plan in _plans_of(statements, "ORDER BY RANDOM()"):
+            assert "SEARCH telegram_users USING COVERING INDEX idx_telegram_users_referred_by" in plan
+
+    run_with_db(test)
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from config.settings import settings
+from database.sqlite_manager import SQLiteManager
+from utils.segments import BroadcastSegment
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket shared by all broadcast workers"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after Telegram's retry_after)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def classify_send_error(error: Exception) -> Optional[str]:
+    """Return the delivery_status for errors that will never go away, None for transient ones"""
+    if isinstance(error, TelegramForbiddenError):
+        # Bot was blocked by the user or the user is deactivated
+        return 'blocked'
+    if isinstance(error, TelegramBadRequest) and 'chat not found' in str(error).lower():
+        return 'not_found'
+    return None
+
+
+class BroadcastEngine:
+    """Runs broadcast jobs in the background with rate limiting and crash-safe progress"""
+
+    def __init__(self, rate: float, workers: int, max_retries: int):
+        self.bucket = TokenBucket(rate, rate)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    async def start_job(
+            self,
+            bot: Bot,
+            admin_id: int,
+            from_chat_id: int,
+            message_id: int,
+            segment: Optional[BroadcastSegment] = None,
+            variants: Optional[Dict[str, int]] = None
+    ) -> int:
+        """
+        Persist a new broadcast job and start sending it in the background
+
+        Args:
+            segment: audience filter, all reachable users if None
+            variants: language -> message_id of per-language copies; only those languages are targeted
+        """
+        if variants:
+            segment = segment or BroadcastSegment()
+            segment.languages = [lang for lang in (segment.languages or variants) if lang in variants]
+
+        job_id = await SQLiteManager.create_broadcast_job(admin_id, from_chat_id, message_id, segment, variants)
+        job = await SQLiteManager.get_broadcast_job(job_id)
+        self._spawn(bot, job)
+        return job_id
+
+    async def resume_jobs(self, bot: Bot):
+        """Resume jobs that were interrupted by a restart"""
+        for job in await SQLiteManager.get_running_broadcast_jobs():
+            logger.info(f"Resuming broadcast job {job['id']}")
+            self._spawn(bot, job)
+
+    async def stop(self, timeout: float = 10):
+        """Let workers finish their current delivery, then stop all jobs"""
+        self._stopping.set()
+        if not self._jobs:
+            return
+
+        _, pending = await asyncio.wait(list(self._jobs.values()), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _spawn(self, bot: Bot, job: Dict):
+        if job['id'] in self._jobs:
+            return
+        task = asyncio.create_task(self._run_job(bot, job), name=f"broadcast-{job['id']}")
+        self._jobs[job['id']] = task
+        task.add_done_callback(lambda t: self._on_job_done(job['id'], t))
+
+    def _on_job_done(self, job_id: int, task: asyncio.Task):
+        self._jobs.pop(job_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Broadcast job {job_id} crashed, it will resume on restart", exc_info=task.exception())
+
+    async def _run_job(self, bot: Bot, job: Dict):
+        job_id = job['id']
+        segment = BroadcastSegment.from_json(job['segment'])
+        variants = json.loads(job['variants']) if job['variants'] else {}
+        recipients: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker():
+            while True:
+                recipient = await recipients.get()
+                if recipient is None:
+                    return
+                telegram_id, language = recipient
+                try:
+                    await self._deliver(bot, job, telegram_id, variants.get(language, job['message_id']))
+                except Exception as e:
+                    # One bad recipient must not take the worker down with it
+                    logger.error(f"Broadcast job {job_id}: delivery to {telegram_id} failed: {e}")
+                    await SQLiteManager.finish_broadcast_delivery(job_id, telegram_id, False, str(e))
+
+        async def put(item):
+            """Queue an item; raises the error of a dead worker instead of waiting forever for room"""
+            if not recipients.full():
+                recipients.put_nowait(item)
+                return
+            put_task = asyncio.ensure_future(recipients.put(item))
+            await asyncio.wait([put_task, *workers], return_when=asyncio.FIRST_COMPLETED)
+            if not put_task.done():
+                put_task.cancel()
+                failed = next(task for task in workers if task.done())
+                raise failed.exception() or RuntimeError(f"Broadcast job {job_id}: a worker exited early")
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            async for recipient in SQLiteManager.iter_pending_broadcast_recipients(
+                    job_id, segment, settings.broadcast_page_size):
+                if self._stopping.is_set():
+                    break
+                await put(recipient)
+
+            for _ in workers:
+                await put(None)
+            await asyncio.gather(*workers)
+        finally:
+            # Only left running if the producer failed or was cancelled
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if self._stopping.is_set():
+            logger.info(f"Broadcast job {job_id} paused for shutdown")
+            return
+
+        job = await SQLiteManager.complete_broadcast_job(job_id)
+        pruned_count = await SQLiteManager.count_unreachable_users()
+        logger.info(f"Broadcast job {job_id} completed: {job['sent']} sent, {job['failed']} failed")
+        try:
+            await bot.send_message(
+                job['admin_id'],
+                f"📊 **Broadcast Complete**\n\n"
+                f"✅ Successfully sent: {job['sent']}\n"
+                f"❌ Failed to send: {job['failed']}\n"
+                f"📱 Total users: {job['total']}\n"
+                f"🚫 Pruned recipients (blocked/deleted): {pruned_count}",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Failed to send broadcast report for job {job_id}: {e}")
+
+    async def _deliver(self, bot: Bot, job: Dict, telegram_id: int, message_id: int):
+        """Send one copy of the job's message, honouring retry_after"""
+        if not await SQLiteManager.claim_broadcast_delivery(job['id'], telegram_id):
+            return
+
+        error: Optional[str] = None
+        for _ in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                await bot.copy_message(telegram_id, job['from_chat_id'], message_id)
+                error = None
+                break
+            except TelegramRetryAfter as e:
+                logger.warning(f"Broadcast flood control, pausing for {e.retry_after}s")
+                self.bucket.pause(e.retry_after)
+                error = str(e)
+            except Exception as e:
+                error = str(e)
+                unreachable_status = classify_send_error(e)
+                if unreachable_status:
+                    logger.info(f"Pruning broadcast recipient {telegram_id}: {e}")
+                    await SQLiteManager.mark_user_unreachable(telegram_id, unreachable_status)
+                else:
+                    logger.error(f"Failed to send broadcast to {telegram_id}: {e}")
+                break
+
+        await SQLiteManager.finish_broadcast_delivery(job['id'], telegram_id, error is None, error)
+
+
+broadcast_engine = BroadcastEngine(
+    settings.broadcast_rate_per_second,
+    settings.broadcast_workers,
+    settings.broadcast_max_retries
+)
@@ -0,0 +1,32 @@
+from dataclasses import asdict, dataclass
+from typing import Optional
+from aiogram.fsm.context import FSMContext
+
+# FSM data key the registration form is kept under
+REGISTRATION_FORM_KEY = 'registration'
+
+
+@dataclass(slots=True)
+class RegistrationForm:
+    """Answers collected by the registration flow; the olympiad and profile are kept by id only"""
+    olympiad_id: str
+    profile_id: Optional[str] = None
+    email: Optional[str] = None
+    date_of_birth: Optional[str] = None  # YYYY-01-01
+    passport_id: Optional[str] = None
+    gender: Optional[str] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    heard_about_us: Optional[str] = None
+    has_participated_before: Optional[bool] = None
+
+    @classmethod
+    async def load(cls, state: FSMContext) -> Optional["RegistrationForm"]:
+        """Form of the current session, None if registration was not started or the session expired"""
+        fields = await state.get_value(REGISTRATION_FORM_KEY)
+        return cls(**fields) if fields else None
+
+    async def save(self, state: FSMContext):
+        """Store the form as its filled-in fields, so any FSM storage can serialize it"""
+        fields = {name: value for name, value in asdict(self).items() if value is not None}
+        await state.update_data({REGISTRATION_FORM_KEY: fields})
@@ -1,9 +1,18 @@
+import asyncio
 import base64
 import hashlib
-from typing import Optional
+from typing import Any, Dict, Optional
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
 from config.settings import settings
+from utils.cache import TTLCache
+
+# Channel membership results, cached with separate TTLs for members and non-members
+_membership_cache = TTLCache(settings.channel_member_cache_size, settings.channel_member_cache_ttl)
+# In-flight get_chat_member calls, shared by concurrent checks for the same user
+_membership_inflight: Dict[int, asyncio.Task] = {}
+# Users whose non-member result was dropped on request recently; limits forced re-checks per user
+_membership_refreshes = TTLCache(settings.channel_member_cache_size, settings.channel_nonmember_cache_ttl)
 
 def generate_referral_code(telegram_id: int) -> str:
     """Generate a unique referral code for user"""
@@ -19,14 +28,57 @@ def decode_referral_code(code: str) -> Optional[int]:
     # For now, we'll handle this in the start handler
     return None
 
-async def check_user_in_channel(bot: Bot, user_id: int) -> bool:
-    """Check if user has joined the required channel"""
+async def _fetch_channel_membership(bot: Bot, user_id: int) -> bool:
+    """Ask Telegram whether user is a channel member"""
     try:
         member = await bot.get_chat_member(chat_id=settings.channel_id, user_id=user_id)
         return member.status in ["member", "administrator", "creator"]
     except TelegramBadRequest:
         return False
 
+def _store_channel_membership(user_id: int, epoch: int, task: asyncio.Task):
+    """Cache a finished membership lookup (errors are not cached)"""
+    _membership_inflight.pop(user_id, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    is_member = task.result()
+    ttl = settings.channel_member_cache_ttl if is_member else settings.channel_nonmember_cache_ttl
+    _membership_cache.set(user_id, is_member, ttl=ttl, epoch=epoch)
+
+async def check_user_in_channel(bot: Bot, user_id: int) -> bool:
+    """Check if user has joined the required channel"""
+    cached = _membership_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    task = _membership_inflight.get(user_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_channel_membership(bot, user_id))
+        task.add_done_callback(lambda t, epoch=_membership_cache.epoch: _store_channel_membership(user_id, epoch, t))
+        _membership_inflight[user_id] = task
+
+    # Shield so one cancelled waiter does not cancel the shared call for the others
+    return await asyncio.shield(task)
+
+def invalidate_channel_membership(user_id: Optional[int] = None):
+    """Forget cached membership for user (or for everyone if user_id is None)"""
+    if user_id is None:
+        _membership_cache.clear()
+    else:
+        _membership_cache.invalidate(user_id)
+
+def refresh_channel_nonmember(user_id: int):
+    """Let the next check re-ask Telegram about a cached non-member, at most once per non-member TTL"""
+    if _membership_cache.peek(user_id) is not False or _membership_refreshes.get(user_id):
+        return
+    _membership_refreshes.set(user_id, True)
+    invalidate_channel_membership(user_id)
+
+def get_channel_membership_cache_stats() -> Dict[str, Any]:
+    """Counters of the membership cache"""
+    return _membership_cache.stats()
+
 def create_referral_link(telegram_id: int, bot_username: str) -> str:
     """Create referral link for user"""
     referral_code = generate_referral_code(telegram_id)
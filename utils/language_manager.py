@@ -1,6 +1,5 @@
 import json
-import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Iterator, List, Tuple
 from pathlib import Path
 
 
@@ -11,17 +10,59 @@ class LanguageManager:
     DEFAULT_LANGUAGE = 'en'
     
     _translations: Dict[str, Dict[str, Any]] = {}
+
+    # (language, dotted_key) -> (text, has_placeholders), English fallbacks already filled in
+    _compiled: Dict[Tuple[str, str], Tuple[str, bool]] = {}
+    _reload_hooks: List[Callable[[], None]] = []
     
     @classmethod
     def load_translations(cls):
-        """Load all translation files"""
+        """Load all translation files and compile the lookup table"""
         locales_dir = Path(__file__).parent.parent / 'locales'
         
+        translations = {}
         for lang in cls.SUPPORTED_LANGUAGES:
             lang_file = locales_dir / f'{lang}.json'
             if lang_file.exists():
                 with open(lang_file, 'r', encoding='utf-8') as f:
-                    cls._translations[lang] = json.load(f)
+                    translations[lang] = json.load(f)
+
+        cls._translations = translations
+        cls._compiled = cls._compile(translations)
+
+    @classmethod
+    def reload(cls):
+        """Re-read translation files and notify everything that cached rendered text"""
+        cls.load_translations()
+        for hook in cls._reload_hooks:
+            hook()
+
+    @classmethod
+    def on_reload(cls, hook: Callable[[], None]) -> Callable[[], None]:
+        """Register a callback run after translations are reloaded (usable as a decorator)"""
+        cls._reload_hooks.append(hook)
+        return hook
+
+    @classmethod
+    def _compile(cls, translations: Dict[str, Dict[str, Any]]) -> Dict[Tuple[str, str], Tuple[str, bool]]:
+        """Flatten nested translations into one table, resolving the English fallback up front"""
+        default = dict(cls._flatten(translations.get(cls.DEFAULT_LANGUAGE, {})))
+        compiled = {}
+        for lang in cls.SUPPORTED_LANGUAGES:
+            texts = dict(default)
+            texts.update(cls._flatten(translations.get(lang, {})))
+            for key, text in texts.items():
+                compiled[(lang, key)] = (text, '{' in text)
+        return compiled
+
+    @classmethod
+    def _flatten(cls, dictionary: Dict[str, Any], prefix: str = '') -> Iterator[Tuple[str, str]]:
+        """Yield (dotted_key, text) for every string in a nested translation dict"""
+        for key, value in dictionary.items():
+            if isinstance(value, dict):
+                yield from cls._flatten(value, f'{prefix}{key}.')
+            elif isinstance(value, str):
+                yield f'{prefix}{key}', value
     
     @classmethod
     def get_text(cls, key: str, language: str = DEFAULT_LANGUAGE, **kwargs) -> str:
@@ -36,49 +77,26 @@ class LanguageManager:
         Returns:
             Translated text with formatted variables
         """
-        if not cls._translations:
-            cls.load_translations()
-        
-        # Validate language
-        if language not in cls.SUPPORTED_LANGUAGES:
-            language = cls.DEFAULT_LANGUAGE
-        
-        # Get translation
-        translation_dict = cls._translations.get(language, {})
-        text = cls._get_nested_value(translation_dict, key)
-        
-        # Fallback to English if translation not found
-        if text is None:
-            translation_dict = cls._translations.get(cls.DEFAULT_LANGUAGE, {})
-            text = cls._get_nested_value(translation_dict, key)
-        
-        # Return key if still not found
-        if text is None:
-            return key
+        entry = cls._compiled.get((language, key))
+
+        # Unsupported language, or a key missing from English too
+        if entry is None:
+            if not cls._compiled:
+                cls.load_translations()
+            entry = cls._compiled.get((language, key)) or cls._compiled.get((cls.DEFAULT_LANGUAGE, key))
+            if entry is None:
+                return key
         
+        text, has_placeholders = entry
+        if not has_placeholders or not kwargs:
+            return text
+
         # Format text with provided variables
         try:
-            if kwargs:
-                text = text.format(**kwargs)
+            return text.format(**kwargs)
         except KeyError as e:
             # If formatting fails, return text as is
-            pass
-        
-        return text
-    
-    @classmethod
-    def _get_nested_value(cls, dictionary: Dict, key: str) -> Optional[str]:
-        """Get nested value from dictionary using dot notation"""
-        keys = key.split('.')
-        value = dictionary
-        
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-            else:
-                return None
-        
-        return value if isinstance(value, str) else None
+            return text
     
     @classmethod
     def get_button_text(cls, button_key: str, language: str = DEFAULT_LANGUAGE) -> str:
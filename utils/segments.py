@@ -0,0 +1,79 @@
+import json
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import List, Optional, Any, Dict
+
+# Order in which per-language broadcast variants are requested from the admin
+BROADCAST_LANGUAGES = ('en', 'ru', 'uz')
+
+
+@dataclass
+class BroadcastSegment:
+    """Audience filter for a broadcast; empty fields mean 'no restriction'"""
+    languages: List[str] = field(default_factory=list)
+    min_points: Optional[int] = None
+    max_points: Optional[int] = None
+    created_after: Optional[str] = None  # YYYY-MM-DD, inclusive
+    created_before: Optional[str] = None  # YYYY-MM-DD, inclusive
+    min_referrals: Optional[int] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "BroadcastSegment":
+        """
+        Parse an admin filter such as `lang=ru,uz points>=10 points<=100 since=2025-01-01 until=2025-06-30 referrals>=3`
+
+        Raises:
+            ValueError: if a filter is not recognized or malformed
+        """
+        segment = cls()
+        for token in text.split():
+            token = token.strip().lower()
+            if token in ('all', 'variants'):
+                continue
+
+            if token.startswith('lang='):
+                segment.languages = [lang for lang in token[5:].split(',') if lang]
+            elif token.startswith('points>='):
+                segment.min_points = int(token[8:])
+            elif token.startswith('points<='):
+                segment.max_points = int(token[8:])
+            elif token.startswith('since='):
+                segment.created_after = cls._parse_date(token[6:])
+            elif token.startswith('until='):
+                segment.created_before = cls._parse_date(token[6:])
+            elif token.startswith('referrals>='):
+                segment.min_referrals = int(token[11:])
+            else:
+                raise ValueError(f"Unknown filter: {token}")
+        return segment
+
+    @staticmethod
+    def _parse_date(value: str) -> str:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+    @classmethod
+    def from_json(cls, value: Optional[str]) -> "BroadcastSegment":
+        return cls(**json.loads(value)) if value else cls()
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def describe(self) -> str:
+        """Human readable summary for admin messages"""
+        parts = []
+        if self.languages:
+            parts.append(f"language: {', '.join(self.languages)}")
+        if self.min_points is not None:
+            parts.append(f"points ≥ {self.min_points}")
+        if self.max_points is not None:
+            parts.append(f"points ≤ {self.max_points}")
+        if self.created_after:
+            parts.append(f"joined since {self.created_after}")
+        if self.created_before:
+            parts.append(f"joined until {self.created_before}")
+        if self.min_referrals is not None:
+            parts.append(f"referrals ≥ {self.min_referrals}")
+        return "; ".join(parts) if parts else "all users"
@@ -22,9 +22,12 @@ class UserStates(StatesGroup):
 
 class AdminStates(StatesGroup):
     admin_menu = State()
+    broadcast_segment = State()
     broadcast_message = State()
+    broadcast_variant = State()
     set_olympiad_price = State()
     set_olympiad_limit = State()
+    referral_analytics = State()
 
     # Olympiad management states
     create_olympiad_id = State()